@@ -0,0 +1,69 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+SAMPLE_CONFIG = SRC.parent / "config.sample.toml"
+
+# Each child imports what its entry point imports and builds its objects, without connecting to anything.
+HEADLESS = """
+import tomllib
+from config import Config
+from engine import Engine
+config = Config()
+with open(sys.argv[1], "rb") as f:
+    config.update_from_file(tomllib.load(f))
+config.validate()
+Engine(config)
+"""
+GUI = """
+from PySide6.QtWidgets import QApplication
+from main import Window
+app = QApplication([])
+window = Window()
+"""
+
+
+def measure(code, runs):
+    # Returns (median wall time in ms, largest max RSS in MB) over `runs` fresh interpreters.
+    times = []
+    rss = 0
+    env = os.environ | {"QT_QPA_PLATFORM": "offscreen"}
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-c", f"import sys; sys.path.insert(0, {str(SRC)!r})\n{code}", str(SAMPLE_CONFIG)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        times.append((time.perf_counter() - start) * 1000)
+        if os.waitstatus_to_exitcode(status) != 0:
+            return None
+
+        rss = max(rss, usage.ru_maxrss / 1024)
+
+    return (sorted(times)[len(times) // 2], rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare startup time and memory of the headless and GUI builds.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'entry point':>12} {'startup_ms':>10} {'max_rss_mb':>10}")
+    for name, code in [("headless", HEADLESS), ("gui", GUI)]:
+        result = measure(code, args.runs)
+        if result is None:
+            print(f"{name:>12} failed to start, is PySide6 installed?")
+            continue
+
+        print(f"{name:>12} {result[0]:>10.0f} {result[1]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fake_obs import FakeOBS
+from fake_sheets import FakeSheets
+
+from config import Config
+from engine import Engine
+from loader import OBSConnection
+from sheets import SheetsClient, column_letters
+
+TAB_NAME = "Sheet1"
+ROWS = 1000
+COLS = 26
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+
+    values = sorted(values)
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+def build_obs(sources, scenes, groups):
+    inputs = {}
+    cells = []
+    for index in range(sources):
+        row, col = divmod(index, COLS)
+        name = f"Source {index} | {column_letters(col)}{row + 1}"
+        inputs[name] = {"kind": "text_gdiplus_v3", "settings": {}}
+        cells.append((row, col, name))
+
+    names = list(inputs)
+    scene_list = [{"name": f"Scene {index}", "items": names[index::scenes]} for index in range(scenes)]
+    group_list = [{"name": f"Group {index}", "items": names[index::groups][:10]} for index in range(groups)]
+    return FakeOBS(scene_list, group_list, inputs).start(), cells
+
+
+def build_config(obs_server, sheets_server, interval, minimal_ranges, streaming_parse=False):
+    config = Config()
+    config.api_key = "benchmark"
+    config.spreadsheet_id = "benchmark"
+    config.tab_name = TAB_NAME
+    config.range = f"A1:{column_letters(COLS - 1)}{ROWS}"
+    config.update_interval = interval
+    config.dimension = "ROWS"
+    config.obs_host = "127.0.0.1"
+    config.obs_port = obs_server.port
+    config.sheets_url = sheets_server.url
+    config.minimal_ranges = minimal_ranges
+    config.streaming_parse = streaming_parse
+    config.validate()
+    return config
+
+
+class Timings:
+    # Wraps the fetch and apply phases of the real code path to time them.
+    def __init__(self):
+        self.fetch = []
+        self.apply = []
+        self.original_fetch = SheetsClient.fetch
+        self.original_apply = OBSConnection.apply
+
+    def __enter__(self):
+        timings = self
+
+        def fetch(self):
+            start = time.perf_counter()
+            try:
+                return timings.original_fetch(self)
+            finally:
+                timings.fetch.append(time.perf_counter() - start)
+
+        def apply(self, data, dimension):
+            start = time.perf_counter()
+            try:
+                return timings.original_apply(self, data, dimension)
+            finally:
+                if data:
+                    timings.apply.append(time.perf_counter() - start)
+
+        SheetsClient.fetch = fetch
+        OBSConnection.apply = apply
+        return self
+
+    def __exit__(self, *args):
+        SheetsClient.fetch = self.original_fetch
+        OBSConnection.apply = self.original_apply
+
+    def reset(self):
+        self.fetch.clear()
+        self.apply.clear()
+
+
+def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def run_scenario(sources, changes, seconds, interval, scenes, groups, minimal_ranges, streaming_parse):
+    obs_server, cells = build_obs(sources, scenes, groups)
+    sheets_server = FakeSheets(TAB_NAME, ROWS, COLS).start()
+    for row, col, _ in cells:
+        sheets_server.write(row, col, f"initial {row}:{col}")
+
+    config = build_config(obs_server, sheets_server, interval, minimal_ranges, streaming_parse)
+    with Timings() as timings:
+        engine = Engine(config)
+        thread = threading.Thread(target=engine.run, daemon=True)
+        thread.start()
+        # Let the first full sync finish before measuring the steady state.
+        wait_for(lambda: len(obs_server.writes) >= sources, 30)
+        time.sleep(interval / 1000 * 2)
+        timings.reset()
+        obs_server.counts.clear()
+        obs_server.writes.clear()
+        sheets_server.written_at.clear()
+        requests_before = sheets_server.requests
+
+        rng = random.Random(sources * 1000 + changes)
+        deadline = time.monotonic() + seconds
+        tick = 0
+        while time.monotonic() < deadline:
+            for index, (row, col, _) in enumerate(rng.sample(cells, changes)):
+                sheets_server.write(row, col, f"tick {tick} change {index}")
+            tick += 1
+            time.sleep(interval / 1000)
+
+        time.sleep(interval / 1000 * 3)
+        engine.stop()
+        thread.join()
+
+    ticks = max(1, sheets_server.requests - requests_before)
+    latencies = [
+        written - sheets_server.written_at[settings["text"]]
+        for written, _, settings in obs_server.writes
+        if settings.get("text") in sheets_server.written_at
+    ]
+    obs_server.shutdown()
+    sheets_server.shutdown()
+    return {
+        "sources": sources,
+        "changes": changes,
+        "ticks": ticks,
+        "fetch_p50": percentile(timings.fetch, 50) * 1000,
+        "apply_p50": percentile(timings.apply, 50) * 1000,
+        "apply_p95": percentile(timings.apply, 95) * 1000,
+        "apply_p99": percentile(timings.apply, 99) * 1000,
+        "obs_messages": obs_server.counts["message"] / ticks,
+        "obs_reads": obs_server.counts["GetInputSettings"] / ticks,
+        "obs_writes": obs_server.counts["SetInputSettings"] / ticks,
+        "e2e_p50": percentile(latencies, 50) * 1000,
+        "e2e_p95": percentile(latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the polling engine against local fake Sheets and OBS.")
+    parser.add_argument("--sources", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--changes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--seconds", type=float, default=3, help="measured duration of each scenario")
+    parser.add_argument("--interval", type=int, default=100, help="update interval in ms")
+    parser.add_argument("--scenes", type=int, default=40)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--minimal-ranges", action="store_true")
+    parser.add_argument("--streaming-parse", action="store_true")
+    args = parser.parse_args()
+
+    columns = [
+        ("sources", "{:>7}"),
+        ("changes", "{:>7}"),
+        ("ticks", "{:>5}"),
+        ("fetch_p50", "{:>9.2f}"),
+        ("apply_p50", "{:>9.2f}"),
+        ("apply_p95", "{:>9.2f}"),
+        ("apply_p99", "{:>9.2f}"),
+        ("obs_messages", "{:>12.2f}"),
+        ("obs_reads", "{:>9.2f}"),
+        ("obs_writes", "{:>10.2f}"),
+        ("e2e_p50", "{:>7.1f}"),
+        ("e2e_p95", "{:>7.1f}"),
+    ]
+    print("Times in ms, OBS counts per tick.")
+    print(" ".join(f"{name:>{len(fmt.format(0))}}" for name, fmt in columns))
+    for sources in args.sources:
+        for changes in args.changes:
+            if changes > sources:
+                continue
+
+            result = run_scenario(
+                sources,
+                changes,
+                args.seconds,
+                args.interval,
+                args.scenes,
+                args.groups,
+                args.minimal_ranges,
+                args.streaming_parse,
+            )
+            print(" ".join(fmt.format(result[name]) for name, fmt in columns), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+import time
+import uuid
+from collections import Counter
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SUBS_INPUTS = 1 << 3
+
+
+class FakeOBSHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.send_lock = threading.Lock()
+        self.subscriptions = 0
+
+    def handle(self):
+        if not self.handshake():
+            return
+
+        self.send({"op": 0, "d": {"obsWebSocketVersion": "5.5.0", "rpcVersion": 1}})
+        self.server.connect(self)
+        try:
+            while (message := self.recv()) is not None:
+                self.dispatch(json.loads(message))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.server.disconnect(self)
+
+    def handshake(self):
+        headers = {}
+        self.rfile.readline()
+        while (line := self.rfile.readline().decode().strip()) != "":
+            name, _, value = line.partition(":")
+            headers[name.lower()] = value.strip()
+
+        key = headers.get("sec-websocket-key")
+        if key is None:
+            return False
+
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.wfile.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode()
+        )
+        return True
+
+    def recv(self):
+        while True:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return None
+
+            opcode = header[0] & 0x0F
+            length = header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack(">H", self.rfile.read(2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", self.rfile.read(8))[0]
+            mask = self.rfile.read(4) if header[1] & 0x80 else None
+            payload = self.rfile.read(length)
+            if mask:
+                # XOR as one big integer instead of byte by byte, which matters for large request batches.
+                key = (mask * (length // 4 + 1))[:length]
+                payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+            match opcode:
+                case 0x1:
+                    return payload.decode()
+                case 0x8:
+                    self.send_frame(0x8, b"")
+                    return None
+                case 0x9:
+                    self.send_frame(0xA, payload)
+
+    def send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        with self.send_lock:
+            self.wfile.write(header + payload)
+
+    def send(self, message):
+        self.send_frame(0x1, json.dumps(message).encode())
+
+    def dispatch(self, message):
+        data = message["d"]
+        match message["op"]:
+            case 1:
+                self.subscriptions = data.get("eventSubscriptions", 0)
+                self.send({"op": 2, "d": {"negotiatedRpcVersion": 1}})
+            case 6:
+                self.server.count("message")
+                self.send({"op": 7, "d": self.server.execute(data)})
+            case 8:
+                self.server.count("message")
+                results = [self.server.execute(request) for request in data.get("requests", [])]
+                self.send({"op": 9, "d": {"requestId": data["requestId"], "results": results}})
+
+
+class FakeOBS(socketserver.ThreadingTCPServer):
+    # An obs-websocket v5 server with a fixed set of scenes, groups and inputs, and no authentication.
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, scenes, groups, inputs, port=0):
+        super().__init__(("127.0.0.1", port), FakeOBSHandler)
+        self.scenes = scenes
+        self.groups = groups
+        # Input name -> {"kind": str, "settings": dict}
+        self.inputs = inputs
+        self.lock = threading.Lock()
+        self.clients = []
+        self.counts = Counter()
+        # (time, input name, settings) for every SetInputSettings received.
+        self.writes = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def connect(self, client):
+        with self.lock:
+            self.clients.append(client)
+
+    def disconnect(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def emit(self, event_type, event_data, subscription):
+        with self.lock:
+            clients = [client for client in self.clients if client.subscriptions & subscription]
+
+        for client in clients:
+            client.send({"op": 5, "d": {"eventType": event_type, "eventIntent": subscription, "eventData": event_data}})
+
+    def scene_items(self, scene):
+        return [
+            {"sceneItemId": index + 1, "sourceName": name, "inputKind": self.inputs[name]["kind"]}
+            for index, name in enumerate(scene["items"])
+        ]
+
+    def execute(self, request):
+        request_type = request["requestType"]
+        request_data = request.get("requestData", {})
+        self.count(request_type)
+        response = {"requestType": request_type, "requestId": request["requestId"]}
+        status = {"result": True, "code": 100}
+        data = None
+        match request_type:
+            case "GetVersion":
+                data = {"obsVersion": "31.0.0", "obsWebSocketVersion": "5.5.0", "rpcVersion": 1}
+            case "GetSceneList":
+                data = {
+                    "scenes": [{"sceneName": scene["name"], "sceneIndex": i} for i, scene in enumerate(self.scenes)]
+                }
+            case "GetGroupList":
+                data = {"groups": [group["name"] for group in self.groups]}
+            case "GetSceneItemList" | "GetGroupSceneItemList":
+                scenes = self.scenes if request_type == "GetSceneItemList" else self.groups
+                scene = next((scene for scene in scenes if scene["name"] == request_data.get("sceneName")), None)
+                if scene is None:
+                    status = {"result": False, "code": 600, "comment": "No source was found."}
+                else:
+                    data = {"sceneItems": self.scene_items(scene)}
+            case "GetInputList":
+                data = {
+                    "inputs": [
+                        {"inputName": name, "inputKind": item["kind"], "unversionedInputKind": item["kind"]}
+                        for name, item in self.inputs.items()
+                    ]
+                }
+            case "GetInputSettings":
+                item = self.inputs.get(request_data.get("inputName"))
+                if item is None:
+                    status = {"result": False, "code": 600, "comment": "No source was found."}
+                else:
+                    data = {"inputSettings": dict(item["settings"]), "inputKind": item["kind"]}
+            case "SetInputSettings":
+                name = request_data.get("inputName")
+                item = self.inputs.get(name)
+                if item is None:
+                    status = {"result": False, "code": 600, "comment": "No source was found."}
+                else:
+                    settings = request_data.get("inputSettings", {})
+                    with self.lock:
+                        self.writes.append((time.perf_counter(), name, settings))
+                        item["settings"] = item["settings"] | settings if request_data.get("overlay") else settings
+                    self.emit(
+                        "InputSettingsChanged",
+                        {
+                            "inputName": name,
+                            "inputUuid": str(uuid.uuid5(uuid.NAMESPACE_OID, name)),
+                            "inputSettings": item["settings"],
+                        },
+                        SUBS_INPUTS,
+                    )
+            case _:
+                status = {"result": False, "code": 204, "comment": "Unknown request type."}
+
+        response["requestStatus"] = status
+        if data is not None:
+            response["responseData"] = data
+        return response
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
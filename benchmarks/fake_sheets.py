@@ -0,0 +1,86 @@
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sheets import range_bounds
+
+
+# Returns (tab name, top, left, bottom, right) with zero-based indices, where bottom or right is None if the range
+# is open on that side, e.g. `A:B` or `2:5`.
+def parse_range(a1_range):
+    tab_name, _, cells = a1_range.rpartition("!")
+    tab_name = tab_name[1:-1].replace("''", "'") if tab_name.startswith("'") else tab_name
+    return (tab_name, *range_bounds(cells))
+
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if not url.path.endswith("/values:batchGet"):
+            self.send_error(404)
+            return
+
+        value_ranges = [self.server.read_range(a1_range) for a1_range in query.get("ranges", [])]
+        body = json.dumps({"valueRanges": value_ranges}).encode()
+        self.server.requests += 1
+        self.server.bytes_sent += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSheets(ThreadingHTTPServer):
+    # A Sheets v4 `values:batchGet` endpoint over an in-memory grid of one tab, in ROWS major dimension.
+    daemon_threads = True
+
+    def __init__(self, tab_name, rows, cols):
+        super().__init__(("127.0.0.1", 0), FakeSheetsHandler)
+        self.tab_name = tab_name
+        self.grid = [["" for _ in range(cols)] for _ in range(rows)]
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        # Value -> time it was written, to measure how long it takes to reach OBS.
+        self.written_at = {}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v4/spreadsheets"
+
+    def read_range(self, a1_range):
+        _, top, left, bottom, right = parse_range(a1_range)
+        bottom = len(self.grid) - 1 if bottom is None else bottom
+        with self.lock:
+            values = [row[left : None if right is None else right + 1] for row in self.grid[top : bottom + 1]]
+
+        # Like the real API, trailing empty cells and rows are left out.
+        for row in values:
+            while row and row[-1] == "":
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+
+        return {"range": a1_range, "majorDimension": "ROWS", "values": values}
+
+    def write(self, row, col, value):
+        with self.lock:
+            self.grid[row][col] = value
+            self.written_at[value] = time.perf_counter()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
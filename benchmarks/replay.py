@@ -0,0 +1,85 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bench_worker import percentile
+from fake_obs import FakeOBS
+
+from config import Config
+from loader import OBSConnection
+from recording import read_recording
+from sheets import column_letters, quote_tab
+
+
+def recorded_cells(path):
+    cells = set()
+    for _, _, data in read_recording(path):
+        for sheet, values in data.items():
+            cells.update((sheet, row, col) for row, line in enumerate(values) for col in range(len(line)))
+
+    return cells
+
+
+# Starts a fake OBS with one text source bound to every cell the recording ever touches.
+def fake_obs_for(path):
+    inputs = {}
+    aliases = set()
+    for (alias, tab_name), row, col in recorded_cells(path):
+        prefix = f"{alias}:" if alias else ""
+        name = f"Cell | {prefix}{quote_tab(tab_name)}!{column_letters(col)}{row + 1}"
+        inputs[name] = {"kind": "text_gdiplus_v3", "settings": {}}
+        aliases.add(alias)
+
+    scenes = [{"name": "Replay", "items": list(inputs)}]
+    return FakeOBS(scenes, [], inputs).start(), aliases - {None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded snapshot stream against OBS or a fake OBS.")
+    parser.add_argument("recording", help="file written with `record_file`")
+    parser.add_argument("--speed", type=float, default=1, help="replay speed multiplier, or 0 for as fast as possible")
+    parser.add_argument("--host", help="OBS host to replay against instead of a local fake OBS")
+    parser.add_argument("--port", type=int, default=4455)
+    parser.add_argument("--password")
+    parser.add_argument("--tab-name", default="Sheet1", help="tab used by sources without a `Tab!` prefix")
+    args = parser.parse_args()
+
+    config = Config()
+    config.tab_name = args.tab_name
+    config.obs_batch_execution_type = "SERIAL_REALTIME"
+    fake = None
+    if args.host:
+        endpoint = {"host": args.host, "port": args.port, "password": args.password}
+    else:
+        fake, aliases = fake_obs_for(args.recording)
+        config.spreadsheets = {alias: "replay" for alias in aliases}
+        endpoint = {"host": "127.0.0.1", "port": fake.port, "password": None}
+
+    obs = OBSConnection(config, endpoint)
+    applies = []
+    started = time.monotonic()
+    for offset, dimension, data in read_recording(args.recording):
+        if args.speed:
+            time.sleep(max(0.0, started + offset / args.speed - time.monotonic()))
+
+        start = time.perf_counter()
+        obs.apply(data, dimension)
+        applies.append(time.perf_counter() - start)
+
+    elapsed = time.monotonic() - started
+    obs.close()
+    print(f"Replayed {len(applies)} snapshots in {elapsed:.1f}s.")
+    print(
+        f"apply p50 {percentile(applies, 50) * 1000:.2f}ms, p95 {percentile(applies, 95) * 1000:.2f}ms, "
+        f"p99 {percentile(applies, 99) * 1000:.2f}ms, max {max(applies, default=0) * 1000:.2f}ms"
+    )
+    if fake is not None:
+        print(f"OBS messages {fake.counts['message']}, writes {fake.counts['SetInputSettings']}")
+        fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
+from handlers import HANDLER_NAMES
+from sheets import parse_range_reference
+from templates import compile_template
+
+
 class Config:
     def __init__(self):
         self.api_key = None
@@ -10,6 +15,30 @@ class Config:
         self.obs_port = None
         self.auth_enabled = False
         self.obs_password = None
+        self.obs_batch_execution_type = None
+        self.obs_mirrors = []
+        self.obs_debounce = {}
+        self.obs_throttle = {}
+        self.obs_max_writes_per_second = None
+        self.sheets_url = "https://sheets.googleapis.com/v4/spreadsheets"
+        self.metrics_port = None
+        self.trace_file = None
+        self.record_file = None
+        self.event_buffer_size = None
+        self.event_dump_file = None
+        self.webhook_port = None
+        self.webhook_token = None
+        self.minimal_ranges = False
+        self.streaming_parse = False
+        self.spreadsheets = {}
+        self.templates = {}
+        self.min_update_interval = None
+        self.idle_update_interval = None
+        self.quota_per_minute = None
+        self.priority_ranges = []
+        self.priority_update_interval = None
+        self.media_cache_dir = None
+        self.media_cache_size_mb = None
 
     def update_from_ui(self, ui):
         self.api_key = ui.api_key.text()
@@ -23,6 +52,50 @@ class Config:
         self.obs_password = ui.password.text()
         self.auth_enabled = ui.auth_enabled.isChecked()
 
+    def update_from_file(self, config):
+        # The same keys the window fills its fields from, followed by the advanced options.
+        obs_config = config.get("obs", {})
+        password = obs_config.get("password", None)
+        self.api_key = config.get("api_key")
+        self.spreadsheet_id = config.get("spreadsheet_id")
+        self.tab_name = config.get("tab_name")
+        self.range = config.get("range", "A1:Z1000")
+        self.update_interval = int(config.get("update_interval", 1500))
+        self.dimension = str(config.get("dimension", "ROWS")).upper()
+        self.obs_host = obs_config.get("host", "localhost")
+        self.obs_port = int(obs_config.get("port", 4455))
+        self.auth_enabled = bool(password)
+        self.obs_password = password
+        self.update_from_toml(config)
+
+    def update_from_toml(self, config):
+        # Advanced options that have no field in the UI and can only be set through config.toml.
+        obs_config = config.get("obs", {})
+        self.minimal_ranges = bool(config.get("minimal_ranges", False))
+        self.streaming_parse = bool(config.get("streaming_parse", False))
+        self.sheets_url = config.get("sheets_url", self.sheets_url)
+        self.metrics_port = config.get("metrics_port")
+        self.trace_file = config.get("trace_file")
+        self.record_file = config.get("record_file")
+        self.event_buffer_size = config.get("event_buffer_size")
+        self.event_dump_file = config.get("event_dump_file")
+        self.webhook_port = config.get("webhook_port")
+        self.webhook_token = config.get("webhook_token")
+        self.spreadsheets = dict(config.get("spreadsheets", {}))
+        self.templates = dict(config.get("templates", {}))
+        self.min_update_interval = config.get("min_update_interval")
+        self.idle_update_interval = config.get("idle_update_interval")
+        self.quota_per_minute = config.get("quota_per_minute")
+        self.priority_ranges = list(config.get("priority_ranges", []))
+        self.priority_update_interval = config.get("priority_update_interval")
+        self.media_cache_dir = config.get("media_cache_dir")
+        self.media_cache_size_mb = config.get("media_cache_size_mb")
+        self.obs_batch_execution_type = obs_config.get("batch_execution_type")
+        self.obs_mirrors = [dict(mirror) for mirror in obs_config.get("mirrors", [])]
+        self.obs_debounce = dict(obs_config.get("debounce", {}))
+        self.obs_throttle = dict(obs_config.get("throttle", {}))
+        self.obs_max_writes_per_second = obs_config.get("max_writes_per_second")
+
     def validate(self):
         if not self.api_key:
             raise ValueError("API key is required")
@@ -36,6 +109,29 @@ class Config:
         if not self.update_interval:
             print("Update interval not specified, defaulting to 1500ms")
             self.update_interval = 1500
+        if not self.min_update_interval:
+            self.min_update_interval = self.update_interval
+        if not self.idle_update_interval:
+            self.idle_update_interval = self.update_interval
+        if int(self.min_update_interval) > int(self.idle_update_interval):
+            raise ValueError("Minimum update interval must not be greater than the idle update interval")
+        if not self.quota_per_minute:
+            self.quota_per_minute = 300
+        if self.event_buffer_size is None:
+            self.event_buffer_size = 1000
+        if int(self.event_buffer_size) < 0:
+            raise ValueError("Event buffer size must not be negative")
+        if not self.priority_update_interval:
+            self.priority_update_interval = 500
+        for text in self.priority_ranges:
+            (alias, _), _ = parse_range_reference(text, self.tab_name)
+            if alias is not None and alias not in self.spreadsheets:
+                raise ValueError(f"Unknown spreadsheet '{alias}' in priority range '{text}'. Add it to `spreadsheets`.")
+        for name, text in self.templates.items():
+            if compile_template(str(text)) is None:
+                raise ValueError(f"Template for source '{name}' must reference at least one valid cell, e.g. '{{B2}}'")
+        if self.media_cache_dir and not self.media_cache_size_mb:
+            self.media_cache_size_mb = 512
         if self.dimension and str(self.dimension).upper() not in ["ROWS", "COLUMNS"]:
             raise ValueError("Dimension must be either 'ROWS' or 'COLUMNS'")
         if not self.obs_host:
@@ -51,3 +147,21 @@ class Config:
         if self.auth_enabled and self.obs_password is None:
             print("OBS password not specified, defaulting to no password")
             self.obs_password = None
+        if not self.obs_batch_execution_type:
+            self.obs_batch_execution_type = "SERIAL_REALTIME"
+        if str(self.obs_batch_execution_type).upper() not in ["SERIAL_REALTIME", "SERIAL_FRAME"]:
+            raise ValueError("OBS batch execution type must be either 'SERIAL_REALTIME' or 'SERIAL_FRAME'")
+        self.obs_batch_execution_type = str(self.obs_batch_execution_type).upper()
+        if self.obs_max_writes_per_second is not None and float(self.obs_max_writes_per_second) < 0:
+            raise ValueError("OBS max writes per second must not be negative")
+        for kind in [*self.obs_debounce, *self.obs_throttle]:
+            if kind not in HANDLER_NAMES.values():
+                raise ValueError(f"Unknown source type '{kind}' in OBS debounce or throttle settings")
+        for mirror in self.obs_mirrors:
+            mirror["host"] = mirror.get("host") or "localhost"
+            mirror["port"] = int(mirror.get("port") or 4455)
+            mirror["password"] = mirror.get("password") or None
+
+    def obs_endpoints(self):
+        primary = {"host": self.obs_host, "port": self.obs_port, "password": self.obs_password}
+        return [primary, *self.obs_mirrors]
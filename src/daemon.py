@@ -0,0 +1,67 @@
+import argparse
+import logging
+import signal
+import sys
+import tomllib
+
+from config import Config
+from engine import Engine
+from events import events
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+# Logs the CPU time and memory used to get ready, imports included, to keep an eye on the cost of startup.
+def log_startup(logger):
+    if resource is None:
+        return
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS.
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    logger.info(f"Ready after {usage.ru_utime + usage.ru_stime:.2f}s of CPU time, using {rss:.1f}MB RSS.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll Google Sheets and update OBS sources without the window.")
+    parser.add_argument("config", help="path to config.toml")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger = logging.getLogger("daemon")
+
+    with open(args.config, "rb") as f:
+        config = Config()
+        config.update_from_file(tomllib.load(f))
+    try:
+        config.validate()
+    except ValueError as e:
+        logger.error(f"Invalid configuration: {e}")
+        return 2
+
+    engine = Engine(config)
+
+    def on_signal(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, stopping.")
+        engine.stop()
+
+    def on_dump(signum, frame):
+        events.dump(config.event_dump_file or "events.log", reason=signal.Signals(signum).name)
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, "SIGUSR1"):
+        # Not available on Windows.
+        signal.signal(signal.SIGUSR1, on_dump)
+    log_startup(logger)
+    engine.run()
+    logger.info("Stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from obsws_python.error import OBSSDKError, OBSSDKRequestError
+from websocket import WebSocketException
+
+from events import events
+from loader import OBSConnection
+from metrics import metrics
+
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30
+
+
+class Endpoint:
+    # One OBS instance fed from the shared sheet poll. Each endpoint applies snapshots on its own thread
+    # with its own shadow state, so a slow or unreachable OBS never holds up the others.
+    def __init__(self, config, endpoint, media_cache=None):
+        self.config = config
+        self.endpoint = endpoint
+        self.media_cache = media_cache
+        self.name = f"{endpoint['host']}:{endpoint['port']}"
+        self.obs = None
+        # The last connection that applied anything, kept after a disconnect so the next one can start warm.
+        self.previous = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self.pending = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"obs-{self.name}")
+        self.logger = logging.getLogger(__name__)
+
+    def connect(self):
+        # Reconnects back off exponentially with jitter, up to RECONNECT_MAX_SECONDS, while the sheet keeps
+        # being polled. Ticks that arrive in between are skipped; the first one after reconnecting catches up.
+        if time.monotonic() < self.retry_at:
+            return
+
+        try:
+            self.obs = OBSConnection(self.config, self.endpoint, self.media_cache, self.previous)
+            self.obs.apply(None, self.config.dimension)
+        except (OBSSDKError, OSError, WebSocketException) as e:
+            self.failures += 1
+            delay = min(RECONNECT_MAX_SECONDS, RECONNECT_MIN_SECONDS * 2 ** (self.failures - 1))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            self.retry_at = time.monotonic() + delay
+            self.logger.error(f"Failed to connect to OBS at {self.name}: {e}. Retrying in {delay:.1f}s.")
+            metrics.count("errors", source="obs", code="connect")
+            self.disconnect()
+            return
+
+        if self.failures or self.previous:
+            self.logger.info(f"Reconnected to OBS at {self.name} after {self.failures + 1} attempt(s).")
+        else:
+            self.logger.info(f"Connected to OBS at {self.name}.")
+        events.record("connected", self.name)
+        self.failures = 0
+        self.previous = None
+
+    def disconnect(self):
+        if self.obs is None:
+            return
+
+        # A connection that failed before it finished reconciling has nothing newer than the one before it.
+        if self.obs.applied is not None and self.obs.warm_shadow is None:
+            self.previous = self.obs
+        try:
+            self.obs.close()
+        except (OBSSDKError, OSError, WebSocketException):
+            pass
+        self.obs = None
+
+    def lost(self, reason):
+        metrics.count("errors", source="obs", code="disconnected")
+        events.record("disconnected", self.name, detail=reason)
+        # Keeps what led up to it, if `event_dump_file` is set.
+        events.dump(reason=f"lost connection to OBS at {self.name}")
+        self.disconnect()
+
+    def tick(self, data):
+        # Runs on the executor, whose futures are never checked, so anything unexpected has to be logged here.
+        try:
+            self.update(data)
+        except Exception:
+            self.logger.exception(f"Failed to apply sheet data to OBS at {self.name}.")
+            metrics.count("errors", source="obs", code="internal")
+
+    def update(self, data):
+        if self.obs is not None and not self.obs.alive():
+            self.logger.error(f"Lost connection to OBS at {self.name}.")
+            self.lost("closed")
+
+        if self.obs is None:
+            self.connect()
+            if self.obs is None:
+                return
+
+        metrics.begin_trace("apply", endpoint=self.name)
+        try:
+            self.obs.apply(data, self.config.dimension)
+        except OBSSDKRequestError as e:
+            # A single request failed, e.g. for an input removed mid-tick, but the connection is fine. The snapshot
+            # is not recorded as applied, so the next tick tries again.
+            self.logger.error(f"Request to OBS at {self.name} failed: {e}")
+            events.record("failed", self.name, e.req_name, e.code)
+            metrics.count("errors", source="obs", code=e.code)
+        except (OBSSDKError, OSError, WebSocketException) as e:
+            self.logger.error(f"Lost connection to OBS at {self.name}: {e}")
+            self.lost(e)
+        finally:
+            metrics.end_trace()
+
+    def start(self):
+        self.pending = self.executor.submit(self.connect)
+        return self.pending
+
+    def submit(self, data):
+        # A tick that arrives while the previous one is still being applied is dropped. The next one
+        # catches up, since it is diffed against the last snapshot this endpoint actually applied.
+        if self.pending is not None and not self.pending.done():
+            self.logger.debug("OBS at %s is still applying the previous tick, skipping.", self.name)
+            return
+
+        self.pending = self.executor.submit(self.tick, data)
+
+    def bindings(self):
+        # Read from the engine thread while this endpoint may be reconnecting, so take the connection once.
+        obs = self.obs
+        if obs is None:
+            return (None, ())
+
+        return (obs.bindings_version, obs.bindings.keys())
+
+    def sources_on(self, sheet):
+        obs = self.obs
+        return obs.sources_on(sheet) if obs is not None else set()
+
+    def media_in_use(self):
+        # OBS keeps showing what the previous connection set while this endpoint is reconnecting.
+        paths = set()
+        for obs in (self.obs, self.previous):
+            if obs is not None:
+                paths.update(obs.media_in_use())
+        return paths
+
+    def close(self):
+        self.executor.submit(self.disconnect)
+        self.executor.shutdown(wait=False)
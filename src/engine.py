@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from endpoint import Endpoint
+from events import events
+from media_cache import MediaCache
+from metrics import metrics
+from recording import Recorder
+from scheduler import Scheduler
+from sheets import SheetsClient, parse_range_reference
+from webhook import Webhook
+
+
+class Engine:
+    def __init__(self, config):
+        self.config = config
+        self.sheets = None
+        self.media_cache = MediaCache(config, self.media_in_use) if config.media_cache_dir else None
+        self.endpoints = [Endpoint(config, endpoint, self.media_cache) for endpoint in config.obs_endpoints()]
+        self.recorder = None
+        self.webhook = None
+        self.last_push = 0.0
+        self.pushed_edits = []
+        # (sheet, A1 range) refreshed every `priority_update_interval` in between polls.
+        self.priority_ranges = [parse_range_reference(text, config.tab_name) for text in config.priority_ranges]
+        self.next_priority = 0.0
+        self.planned_versions = None
+        self.scheduler = Scheduler(config)
+        self.logger = logging.getLogger(__name__)
+        self.stop_event = threading.Event()
+        # Set when the in-flight fetch finishes or when stopping, so the loop never sleeps past either.
+        self.wake_event = threading.Event()
+        # Set when an edit is pushed to the webhook or when stopping, to cut short the wait for the next poll.
+        self.push_event = threading.Event()
+        self.fetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-fetch")
+
+    def fetch_at(self, when):
+        # Waits for `when`, then returns (data, whether it was a targeted fetch of some ranges rather than the
+        # scheduled poll). Until then, edits pushed to the webhook and priority ranges that are due are fetched on
+        # their own, which leaves the poll schedule alone. A poll that is due covers both.
+        while True:
+            # A Sheets error on a fetch made in between polls pushes the next poll back as well.
+            resume = self.scheduler.resume_at
+            when = max(when, resume)
+            next_push = max(self.last_push + self.config.min_update_interval / 1000, resume)
+            wake = when
+            if self.priority_ranges:
+                wake = min(wake, max(self.next_priority, resume))
+            if self.pushed_edits:
+                wake = min(wake, next_push)
+            self.push_event.wait(max(0.0, wake - time.monotonic()))
+            if self.stop_event.is_set():
+                return (None, False)
+
+            self.push_event.clear()
+            if self.webhook:
+                self.pushed_edits.extend(self.webhook.take())
+            now = time.monotonic()
+            if now >= when:
+                break
+
+            # Pushed edits are fetched at most once per `min_update_interval`, so a burst of them cannot eat the quota.
+            # Like priority refreshes, they wait while backing off.
+            edits = []
+            pushed = bool(self.pushed_edits) and now >= next_push
+            if pushed:
+                edits += self.pushed_edits
+                self.last_push = now
+            if self.priority_ranges and now >= max(self.next_priority, resume):
+                self.next_priority = now + self.config.priority_update_interval / 1000
+                edits += self.priority_ranges
+            if not edits:
+                continue
+
+            # Ranges on sheets that have not been fetched since the last plan are left to the next poll.
+            edits = self.sheets.fetchable(dict.fromkeys(edits))
+            if not edits:
+                if pushed:
+                    self.pushed_edits = []
+                continue
+
+            # One request per spreadsheet, only made if it does not delay the next poll for quota. Otherwise pushed
+            # edits are tried again later or picked up by that poll.
+            if not self.scheduler.bucket.take(len({sheet[0] for sheet, _ in edits}), now):
+                self.logger.debug("Sheets quota is reserved for the next poll, skipping a targeted fetch.")
+                continue
+
+            if pushed:
+                self.pushed_edits = []
+            fetched = self.fetch_edits(edits)
+            self.scheduler.targeted_fetched(self.sheets.errors)
+            return (fetched, True)
+
+        self.pushed_edits = []
+        self.next_priority = time.monotonic() + self.config.priority_update_interval / 1000
+        self.logger.debug("Fetching sheet data...")
+        metrics.begin_trace("fetch")
+        try:
+            data = self.sheets.fetch()
+        finally:
+            metrics.end_trace()
+        for sheet in self.sheets.rejected:
+            names = sorted({name for endpoint in self.endpoints for name in endpoint.sources_on(sheet)})
+            self.logger.error(f"Sources reading from tab '{sheet[1]}' will not update: {', '.join(names)}")
+        if data is not None:
+            self.logger.debug("Sheet data fetched successfully." if self.sheets.changed else "Sheet data unchanged.")
+
+        return (data, False)
+
+    def fetch_edits(self, edits):
+        self.logger.debug("Fetching %d range(s) on their own...", len(edits))
+        metrics.begin_trace("fetch", ranges=len(edits))
+        try:
+            return self.sheets.fetch_ranges(edits)
+        finally:
+            metrics.end_trace()
+
+    def media_in_use(self):
+        # Called from a media cache thread before evicting.
+        paths = set()
+        for endpoint in self.endpoints:
+            paths.update(endpoint.media_in_use())
+        return paths
+
+    def plan_fetch(self):
+        # Fetch the union of every endpoint's bound cells, replanning only when a binding table changed.
+        bindings = [endpoint.bindings() for endpoint in self.endpoints]
+        versions = tuple(version for version, _ in bindings)
+        if versions == self.planned_versions:
+            return
+
+        cells = set()
+        for _, bound_cells in bindings:
+            cells.update(bound_cells)
+
+        self.sheets.plan(cells)
+        self.planned_versions = versions
+
+    def schedule_fetch(self, when):
+        # Only called while no fetch is in flight, so the plan never changes under a running request.
+        self.plan_fetch()
+        self.wake_event.clear()
+        pending = self.fetcher.submit(self.fetch_at, when)
+        pending.add_done_callback(lambda _: self.wake_event.set())
+        return pending
+
+    def run(self):
+        self.sheets = SheetsClient(self.config)
+        if self.config.metrics_port:
+            metrics.serve(self.config.metrics_port)
+        if self.config.trace_file:
+            metrics.open_trace(self.config.trace_file)
+        events.configure(int(self.config.event_buffer_size), self.config.event_dump_file)
+        if self.config.record_file:
+            self.recorder = Recorder(self.config.record_file, self.config.dimension)
+        if self.config.webhook_port:
+            self.webhook = Webhook(self.config, self.push_event.set)
+            self.webhook.start()
+        wait([endpoint.start() for endpoint in self.endpoints])
+        next_tick = time.monotonic()
+        try:
+            pending = self.schedule_fetch(next_tick)
+            while not self.stop_event.is_set():
+                self.wake_event.wait()
+                if self.stop_event.is_set():
+                    break
+
+                try:
+                    data, pushed = pending.result()
+                except Exception:
+                    # Polling carries on, so one bad fetch cannot stop every source from updating.
+                    self.logger.exception("Failed to fetch sheet data.")
+                    metrics.count("errors", source="sheets", code="internal")
+                    data, pushed = None, False
+                # A pushed edit leaves the poll schedule alone, so polling stays a slow safety net.
+                if not pushed:
+                    next_tick = self.scheduler.next_tick(
+                        next_tick, self.sheets.changed, self.sheets.errors, max(1, len(self.sheets.plans))
+                    )
+
+                # The next snapshot is fetched in the background while this one is applied to every OBS.
+                pending = self.schedule_fetch(next_tick)
+                if data and self.media_cache:
+                    self.media_cache.prefetch(data)
+                if data and self.recorder and self.sheets.changed:
+                    self.recorder.record(data)
+                for endpoint in self.endpoints:
+                    endpoint.submit(data)
+        finally:
+            for endpoint in self.endpoints:
+                endpoint.close()
+            if self.media_cache:
+                self.media_cache.close()
+            if self.recorder:
+                self.recorder.close()
+            if self.webhook:
+                self.webhook.close()
+            # The metrics server and trace file are process-wide, so they are closed before `run` returns, letting
+            # a restarted engine bind the same port straight away. A trace ending after this is simply not written.
+            metrics.close()
+            # Closing on the fetch thread lets an in-flight request finish without blocking the caller.
+            self.fetcher.submit(self.sheets.close)
+            self.fetcher.shutdown(wait=False)
+
+    def stop(self):
+        self.stop_event.set()
+        self.push_event.set()
+        self.wake_event.set()
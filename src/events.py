@@ -0,0 +1,57 @@
+import logging
+import threading
+import time
+from collections import deque
+
+DEFAULT_SIZE = 1000
+
+
+def format_event(event):
+    timestamp, kind, endpoint, name, detail = event
+    clock = time.strftime("%H:%M:%S", time.localtime(timestamp)) + f".{int(timestamp % 1 * 1000):03d}"
+    line = f"{clock} {endpoint} {kind}"
+    if name is not None:
+        line += f" '{name}'"
+    if detail is not None:
+        line += f" {detail}"
+    return line
+
+
+class Events:
+    # Process-wide ring buffer of the most recent update events (source writes, failed and invalid values,
+    # connections), kept so there is something to look at when a source shows the wrong thing even with debug
+    # logging off. Recording only appends a tuple; events are formatted when they are dumped or shown.
+    def __init__(self, size=DEFAULT_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.buffer = deque(maxlen=size)
+        self.dump_file = None
+        self.dump_lock = threading.Lock()
+
+    def configure(self, size, dump_file):
+        if size != self.buffer.maxlen:
+            self.buffer = deque(self.buffer, maxlen=size)
+        self.dump_file = dump_file
+
+    def record(self, kind, endpoint, name=None, detail=None):
+        # Appending to a deque is thread-safe, so endpoints record without taking a lock.
+        self.buffer.append((time.time(), kind, endpoint, name, detail))
+
+    def lines(self):
+        # Copying a deque happens in one step under the GIL, so it never sees an append half done.
+        return [format_event(event) for event in self.buffer.copy()]
+
+    def dump(self, path=None, reason=None):
+        # Writes the buffer to `path`, or to `event_dump_file` if no path is given, and returns the path written.
+        path = path or self.dump_file
+        if not path:
+            return None
+
+        lines = self.lines()
+        with self.dump_lock, open(path, "a", encoding="utf-8") as file:
+            file.write(f"--- {time.strftime('%Y-%m-%d %H:%M:%S')} {reason or 'dump'}, {len(lines)} event(s)\n")
+            file.writelines(line + "\n" for line in lines)
+        self.logger.info("Wrote %d recent event(s) to %s.", len(lines), path)
+        return path
+
+
+events = Events()
@@ -238,6 +238,12 @@ class Ui_MainWindow(object):
 
         self.horizontalLayout_3.addWidget(self.stop)
 
+        self.events = QPushButton(self.horizontalLayoutWidget)
+        self.events.setObjectName("events")
+        self.events.setMaximumSize(QSize(50, 16777215))
+
+        self.horizontalLayout_3.addWidget(self.events)
+
         MainWindow.setCentralWidget(self.centralwidget)
         self.status_bar = QStatusBar(MainWindow)
         self.status_bar.setObjectName("status_bar")
@@ -455,5 +461,9 @@ class Ui_MainWindow(object):
         self.stop.setStatusTip(QCoreApplication.translate("MainWindow", "Stop the update loop", None))
         # endif // QT_CONFIG(statustip)
         self.stop.setText(QCoreApplication.translate("MainWindow", "Stop", None))
+        # if QT_CONFIG(statustip)
+        self.events.setStatusTip(QCoreApplication.translate("MainWindow", "Show recent source updates", None))
+        # endif // QT_CONFIG(statustip)
+        self.events.setText(QCoreApplication.translate("MainWindow", "Log", None))
 
     # retranslateUi
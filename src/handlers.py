@@ -0,0 +1,108 @@
+import functools
+import re
+
+# Cell values repeat a lot between ticks (team names, colours, the same few media files), so conversions are cached.
+CONVERSION_CACHE_SIZE = 4096
+COLOR_PATTERN = re.compile(r"^#?([0-9a-fA-F]{2})([0-9a-fA-F]{2})([0-9a-fA-F]{2})([0-9a-fA-F]{2})?$")
+MEDIA_PATTERN = re.compile(r"^(?:https?://|[a-zA-Z]:\\|/)")
+
+
+@functools.lru_cache(maxsize=CONVERSION_CACHE_SIZE)
+def map_cell_color(cell_color):
+    matched = COLOR_PATTERN.match(cell_color)
+    if not matched:
+        return None
+
+    alpha = matched.group(4) or "FF"
+    blue = matched.group(3)
+    green = matched.group(2)
+    red = matched.group(1)
+    return int(alpha + blue + green + red, 16)
+
+
+@functools.lru_cache(maxsize=CONVERSION_CACHE_SIZE)
+def map_media_input(value):
+    if MEDIA_PATTERN.match(value):
+        return value
+
+    return None
+
+
+# VLC playlists and slideshows take a list of files; a cell holds one path or URL per line.
+# The list is shared between calls, so it must not be modified.
+@functools.lru_cache(maxsize=CONVERSION_CACHE_SIZE)
+def map_file_list(value):
+    paths = [line.strip() for line in value.splitlines() if line.strip()]
+    if not paths or not all(MEDIA_PATTERN.match(path) for path in paths):
+        return None
+
+    return [{"value": path, "hidden": False, "selected": False} for path in paths]
+
+
+# Settings holding a single file path or URL, which can be pointed at the local media cache instead.
+CACHEABLE_SETTINGS = frozenset(["file", "input"])
+
+# A handler is (setting, convert, invalid message), where `convert` is None when the cell value is used as is.
+IMAGE = ("file", None, None)
+TEXT = ("text", None, None)
+BROWSER = ("url", None, None)
+COLOR = (
+    "color",
+    map_cell_color,
+    "Invalid color format '{value}' for source '{name}'. Expected hex format like '#RRGGBB' or '#AARRGGBB'.",
+)
+MEDIA = (
+    "input",
+    map_media_input,
+    "Invalid media source URL or path '{value}' for source '{name}'. Must be a valid URL or absolute file path.",
+)
+VLC_PLAYLIST = (
+    "playlist",
+    map_file_list,
+    "Invalid playlist '{value}' for source '{name}'. Expected one URL or absolute file path per line.",
+)
+SLIDESHOW = (
+    "files",
+    map_file_list,
+    "Invalid slideshow files '{value}' for source '{name}'. Expected one URL or absolute file path per line.",
+)
+
+# Names used for handlers in config.toml, e.g. in `[obs.debounce]`.
+HANDLER_NAMES = {
+    IMAGE: "image",
+    TEXT: "text",
+    BROWSER: "browser",
+    COLOR: "color",
+    MEDIA: "media",
+    VLC_PLAYLIST: "vlc",
+    SLIDESHOW: "slideshow",
+}
+
+KIND_HANDLERS = {
+    "image_source": IMAGE,
+    "xObsAsyncImageSource": IMAGE,
+    "vlc_source": VLC_PLAYLIST,
+    "slideshow": SLIDESHOW,
+    "slideshow_v2": SLIDESHOW,
+}
+# Kinds matched by prefix, which also covers their versioned and platform-specific variants.
+PREFIX_HANDLERS = (
+    ("text_", TEXT),
+    ("color_source", COLOR),
+    ("browser_source", BROWSER),
+    ("media_source", MEDIA),
+)
+
+
+# Returns the handler for an input kind, or None if the kind is not supported.
+@functools.lru_cache(maxsize=256)
+def resolve_handler(input_kind):
+    handler = KIND_HANDLERS.get(input_kind)
+    if handler is not None:
+        return handler
+
+    for prefix, handler in PREFIX_HANDLERS:
+        if input_kind.startswith(prefix):
+            return handler
+
+    return None
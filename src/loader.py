@@ -1,33 +1,145 @@
+import functools
+import json
 import logging
 import re
+import threading
+import time
+import uuid
 
 import obsws_python as obs
-import requests
+from obsws_python.error import OBSSDKRequestError
+
+from events import events
+from handlers import CACHEABLE_SETTINGS, resolve_handler
+from media_cache import is_remote
+from metrics import metrics
+from sheets import parse_cell, parse_range_reference, range_bounds
+from snapshot import changed_cells
+from templates import compile_template
+from throttle import WriteGate
+
+BATCH_EXECUTION_TYPES = {"SERIAL_REALTIME": 0, "SERIAL_FRAME": 1}
+# SERIAL_FRAME runs one request per rendered frame, so batches are split to finish within the request client's
+# 3 s timeout even at 30 fps.
+SERIAL_FRAME_BATCH_SIZE = 60
+ERROR_VALUES = frozenset(["#N/A", "#VALUE!", "#REF!", "#DIV/0!", "#NUM!", "#NAME?", "#NULL!", "#ERROR!"])
+
+
+# Returns (alias or None, tab name or None, row, col) for the cell after the last pipe in a source name.
+@functools.lru_cache(maxsize=4096)
+def parse_source_name(source_name):
+    matched = re.search(r"\|\s*(?:([\w-]+):)?([^|]+)$", source_name)
+    if not matched:
+        return None
+
+    cell = parse_cell(matched.group(2))
+    if cell is None:
+        return None
+
+    return (matched.group(1), *cell)
+
+
+# Returns the compiled template after the last pipe in a source name, e.g. `Score | {B2} {C2} – {D2} {E2}`, or None.
+def parse_source_template(source_name):
+    _, pipe, text = source_name.rpartition("|")
+    if not pipe or "{" not in text:
+        return None
+
+    return compile_template(text.strip())
 
 
 class OBSConnection:
-    def __init__(self, config):
-        self.obs_client = obs.ReqClient(
-            host=config.obs_host, port=config.obs_port, password=config.obs_password, timeout=3
-        )
+    def __init__(self, config, endpoint, media_cache=None, previous=None):
+        connection = {
+            "host": endpoint["host"],
+            "port": endpoint["port"],
+            "password": endpoint["password"],
+            "timeout": 3,
+        }
+        self.name = f"{endpoint['host']}:{endpoint['port']}"
+        self.obs_client = obs.ReqClient(**connection)
+        try:
+            self.obs_events = obs.EventClient(
+                **connection, subs=obs.Subs.CONFIG | obs.Subs.INPUTS | obs.Subs.SCENEITEMS
+            )
+        except Exception:
+            self.obs_client.disconnect()
+            raise
         self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
-        self.req_path = f"https://sheets.googleapis.com/v4/spreadsheets/{config.spreadsheet_id}/values/{config.tab_name}!{config.range}?key={config.api_key}&majorDimension={config.dimension}"
-
-    def fetch_sheet_data(self):
-        self.logger.debug("Fetching sheet data...")
-        response = requests.get(self.req_path)
-        data = None
-        match response.status_code:
-            case 101:
-                self.logger.error("Error 101: Invalid API key or access denied.")
-            case 200:
-                data = response.json().get("values", [[]])
-                self.logger.debug("Sheet data fetched successfully.")
-            case _:
-                self.logger.error(f"Failed to fetch sheet data: {response.status_code}")
+        self.tab_name = config.tab_name
+        self.media_cache = media_cache
+        self.spreadsheet_aliases = {None} | set(config.spreadsheets)
+        # Source name -> template from the `templates` config table, for sources named without one.
+        self.templates = {name: compile_template(str(text)) for name, text in config.templates.items()}
+        # The last snapshot applied to this OBS, which the next one is diffed against.
+        self.applied = None
+        self.batch_execution_type = BATCH_EXECUTION_TYPES[config.obs_batch_execution_type]
+        self.write_gate = WriteGate(config)
+        # (sheet, (top, left, bottom, right)) of the ranges in `priority_ranges`, whose sources are written first.
+        self.priority_ranges = []
+        for text in config.priority_ranges:
+            sheet, a1_range = parse_range_reference(text, config.tab_name)
+            self.priority_ranges.append((sheet, range_bounds(a1_range)))
+        self.priority_sources = set()
+        # Source name -> input kind, built once from GetInputList and then kept current by events.
+        # Event callbacks run on the EventClient thread, so they only touch this state under the lock
+        # and never issue requests themselves.
+        self.sources_lock = threading.Lock()
+        self.sources = {}
+        self.unresolved_sources = set()
+        self.sources_stale = True
+        # Source name -> last known input settings, so comparing against OBS needs no GetInputSettings
+        # per tick. Seeded on first use, updated on every write and corrected by InputSettingsChanged.
+        self.shadow_settings = {}
+        # Sources that must be re-evaluated even if their cell did not change, e.g. new or renamed sources.
+        self.dirty_sources = set()
+        # Incremented whenever `sources` changes so the binding table knows when to rebuild.
+        self.sources_version = 0
+        self.bindings_version = -1
+        self.bindings = {}
+        self.source_cells = {}
+        # Template sources read several cells, so they are bound apart: source name -> (template, cells, handler)
+        # and cell -> [source name]. Their cells are also keys of `bindings`, so they are fetched like any other.
+        self.source_templates = {}
+        self.cell_templates = {}
+        # After a reconnect, the state of the previous connection to the same OBS, so only what changed while it
+        # was down has to be sent. The shadow settings are checked against OBS once before they are trusted.
+        self.warm_shadow = None
+        if previous is not None:
+            self.applied = previous.applied
+            self.write_gate = previous.write_gate
+            with previous.sources_lock:
+                self.warm_shadow = (dict(previous.sources), dict(previous.shadow_settings))
+        self.obs_events.callback.register(
+            [
+                self.on_input_created,
+                self.on_input_removed,
+                self.on_input_name_changed,
+                self.on_input_settings_changed,
+                self.on_scene_item_created,
+                self.on_current_scene_collection_changed,
+            ]
+        )
+
+    def apply(self, data, dimension):
+        # Sources are refreshed every tick, even without data, so the fetch plan always sees current bindings.
+        self.refresh_sources()
+        self.get_bindings()
+        if not data:
+            return
+
+        changed = None
+        if self.applied:
+            with metrics.timed("diff"):
+                changed = changed_cells(self.applied, data, dimension)
+            metrics.count("cells_changed", len(changed), endpoint=self.name)
+
+        self.update_sources(data, dimension, changed)
+        self.applied = data
 
-        return data
+    def close(self):
+        self.obs_events.disconnect()
+        self.obs_client.disconnect()
 
     def value_of_indices(self, data, row, col, dimension):
         match dimension:
@@ -36,114 +148,416 @@ class OBSConnection:
             case "COLUMNS" if col < len(data) and row < len(data[col]):
                 return data[col][row]
             case _:
-                self.logger.debug(f"Cell at ({row}, {col}) for dimension `{dimension}` not found in data.")
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("Cell at (%d, %d) for dimension `%s` not found in data.", row, col, dimension)
                 return None
 
-    def source_name_to_indices(self, source_name):
-        matched = re.search(r"\|\s*([A-Za-z])([0-9]+)$", source_name)
-        if not matched:
+    def source_name_to_cell(self, source_name):
+        # Accepts `| B26`, `| $AB$26`, `| Tab!B26`, `| 'Tab Name'!B26` and `| alias:Tab!B26`, where the alias names
+        # a spreadsheet from the `spreadsheets` config table. Returns ((alias, tab), row, col), where row and col
+        # are absolute sheet indices since fetched ranges are laid out at their position in the sheet.
+        parsed = parse_source_name(source_name)
+        if parsed is None:
             return None
 
-        col = ord(matched.group(1).upper()) - ord("A")
-        row = int(matched.group(2)) - 1
-        return (row, col)
+        return self.resolve_cell(*parsed)
 
-    def map_cell_color(self, cell_color):
-        matched = re.match(r"^#?([0-9a-fA-F]{2})([0-9a-fA-F]{2})([0-9a-fA-F]{2})([0-9a-fA-F]{2})?$", cell_color)
-        if not matched:
-            return None
+    def resolve_cell(self, alias, tab_name, row, col):
+        return ((alias, tab_name or self.tab_name), row, col)
+
+    def source_template(self, source_name):
+        template = self.templates.get(source_name)
+        return template if template is not None else parse_source_template(source_name)
+
+    def on_input_created(self, data):
+        with self.sources_lock:
+            self.sources[data.input_name] = data.input_kind
+            self.shadow_settings[data.input_name] = data.input_settings
+            self.dirty_sources.add(data.input_name)
+            self.sources_version += 1
+
+    def on_input_removed(self, data):
+        with self.sources_lock:
+            self.sources.pop(data.input_name, None)
+            self.shadow_settings.pop(data.input_name, None)
+            self.sources_version += 1
+
+    def on_input_name_changed(self, data):
+        with self.sources_lock:
+            settings = self.shadow_settings.pop(data.old_input_name, None)
+            if settings is not None:
+                self.shadow_settings[data.input_name] = settings
+
+            input_kind = self.sources.pop(data.old_input_name, None)
+            if input_kind is not None:
+                self.sources[data.input_name] = input_kind
+                self.dirty_sources.add(data.input_name)
+                self.sources_version += 1
+            else:
+                self.unresolved_sources.add(data.input_name)
+
+    def on_input_settings_changed(self, data):
+        with self.sources_lock:
+            # Changes made by hand in OBS are overwritten with the sheet value again on the next tick.
+            if data.input_name in self.sources and data.input_settings != self.shadow_settings.get(data.input_name):
+                self.shadow_settings[data.input_name] = data.input_settings
+                self.dirty_sources.add(data.input_name)
+
+    def on_scene_item_created(self, data):
+        # Only inputs we have never seen need a lookup, e.g. ones created while events were not flowing.
+        with self.sources_lock:
+            if data.source_name not in self.sources and (
+                self.source_name_to_cell(data.source_name) or self.source_template(data.source_name)
+            ):
+                self.unresolved_sources.add(data.source_name)
+
+    def on_current_scene_collection_changed(self, data):
+        with self.sources_lock:
+            self.sources_stale = True
+
+    def rebuild_sources(self):
+        self.logger.debug("Rebuilding source list from OBS...")
+        with self.sources_lock:
+            self.sources_stale = False
+            self.unresolved_sources.clear()
+            self.shadow_settings.clear()
+
+        with metrics.timed("obs_enumerate", endpoint=self.name):
+            inputs = self.obs_client.get_input_list().inputs
+        metrics.count("obs_requests", endpoint=self.name, type="GetInputList")
+        with self.sources_lock:
+            self.sources = {item["inputName"]: item["inputKind"] for item in inputs}
+            self.dirty_sources = set(self.sources)
+            self.sources_version += 1
+
+        if self.warm_shadow is not None:
+            self.reconcile_sources(*self.warm_shadow)
+            self.warm_shadow = None
+
+    def reconcile_sources(self, previous_sources, previous_shadow):
+        # Reads back the settings of every source written before the reconnect in one batch. Only sources that are
+        # new, or whose settings no longer match, are re-evaluated; the rest only see cells that changed since.
+        with self.sources_lock:
+            names = [name for name in previous_shadow if self.sources.get(name) == previous_sources.get(name)]
+
+        results = self.send_batch([("GetInputSettings", name, {"inputName": name}) for name in names], "obs_read")
+        with self.sources_lock:
+            for name, result in results.items():
+                if not result["requestStatus"]["result"]:
+                    continue
+
+                settings = result.get("responseData", {}).get("inputSettings", {})
+                self.shadow_settings[name] = settings
+                if settings == previous_shadow[name]:
+                    self.dirty_sources.discard(name)
+            self.logger.debug(
+                f"Reconciled {len(names)} source(s), {len(self.dirty_sources)} to re-evaluate after reconnecting."
+            )
+
+    def resolve_sources(self, names):
+        for name in names:
+            metrics.count("obs_requests", endpoint=self.name, type="GetInputSettings")
+            try:
+                with metrics.timed("obs_enumerate", endpoint=self.name):
+                    response = self.obs_client.get_input_settings(name)
+            except OBSSDKRequestError:
+                # Scene items can also be scenes or groups, which are not inputs.
+                continue
+
+            with self.sources_lock:
+                self.sources[name] = response.input_kind
+                self.shadow_settings[name] = response.input_settings
+                self.dirty_sources.add(name)
+                self.sources_version += 1
+
+    def refresh_sources(self):
+        if self.sources_stale:
+            self.rebuild_sources()
+
+        with self.sources_lock:
+            unresolved, self.unresolved_sources = self.unresolved_sources, set()
+
+        self.resolve_sources(unresolved)
+
+    def get_shadow_settings(self, name):
+        with self.sources_lock:
+            settings = self.shadow_settings.get(name)
+
+        if settings is None:
+            with metrics.timed("obs_read", endpoint=self.name):
+                settings = self.obs_client.get_input_settings(name).input_settings
+            metrics.count("obs_requests", endpoint=self.name, type="GetInputSettings")
+            with self.sources_lock:
+                self.shadow_settings[name] = settings
 
-        alpha = matched.group(4) or "FF"
-        blue = matched.group(3)
-        green = matched.group(2)
-        red = matched.group(1)
-        return int(alpha + blue + green + red, 16)
+        return settings
 
-    def get_source_types(self):
-        scenes = [json["sceneName"] for json in self.obs_client.get_scene_list().scenes]
-        groups = self.obs_client.get_group_list().groups
-        sources = {}
-        for scene in scenes:
-            for item in self.obs_client.get_scene_item_list(scene).scene_items:
-                sources[item["sourceName"]] = item["inputKind"]
+    def sources_on(self, sheet):
+        # Names of the bound sources that read any cell of `sheet`, e.g. to report a tab Sheets rejected.
+        names = {name for name, (cell_sheet, _, _) in self.source_cells.items() if cell_sheet == sheet}
+        names.update(
+            name for name, (_, cells, _) in self.source_templates.items() if any(cell[0] == sheet for cell in cells)
+        )
+        return names
+
+    def media_in_use(self):
+        # The file paths and URLs this OBS is pointed at, so the media cache does not evict them.
+        with self.sources_lock:
+            return {
+                settings[setting]
+                for settings in self.shadow_settings.values()
+                for setting in CACHEABLE_SETTINGS
+                if setting in settings
+            }
+
+    def send_batch(self, requests, phase):
+        # Sends [(request type, request ID, request data)] as one RequestBatch and returns {request ID: result}.
+        # Under SERIAL_FRAME, long batches go out as several RequestBatches of SERIAL_FRAME_BATCH_SIZE requests.
+        if not requests:
+            return {}
+
+        size = len(requests)
+        if self.batch_execution_type == BATCH_EXECUTION_TYPES["SERIAL_FRAME"]:
+            size = SERIAL_FRAME_BATCH_SIZE
+
+        results = {}
+        for start in range(0, len(requests), size):
+            results |= self.send_request_batch(requests[start : start + size], phase)
+        return results
+
+    def send_request_batch(self, requests, phase):
+        # obsws-python has no RequestBatch helper, so the batch goes over the request client's socket directly.
+        # The request client has no event subscriptions, so the next message is always the batch response.
+        payload = {
+            "op": 8,
+            "d": {
+                "requestId": str(uuid.uuid4()),
+                "haltOnFailure": False,
+                "executionType": self.batch_execution_type,
+                "requests": [
+                    {"requestType": kind, "requestId": request_id, "requestData": data}
+                    for kind, request_id, data in requests
+                ],
+            },
+        }
+        ws = self.obs_client.base_client.ws
+        with metrics.timed(phase, endpoint=self.name):
+            ws.send(json.dumps(payload))
+            response = json.loads(ws.recv())
+        metrics.count("obs_requests", endpoint=self.name, type="RequestBatch")
+        return {result["requestId"]: result for result in response["d"]["results"]}
+
+    def alive(self):
+        # The event thread ends as soon as the socket closes, which notices a lost OBS without sending anything.
+        return self.obs_events.worker.is_alive()
+
+    def set_input_settings_batch(self, writes):
+        if not writes:
+            return
+
+        results = self.send_batch(
+            [
+                ("SetInputSettings", name, {"inputName": name, "inputSettings": settings, "overlay": True})
+                for name, settings in writes.items()
+            ],
+            "obs_write",
+        )
+        metrics.count("obs_writes", len(writes), endpoint=self.name)
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        for name, result in results.items():
+            status = result["requestStatus"]
+            if not status["result"]:
+                self.logger.error(f"Failed to update source '{name}': {status['code']} {status.get('comment', '')}")
+                events.record("failed", self.name, name, status["code"])
+                metrics.count("errors", source="obs", code=status["code"])
+                # Its cell will not differ from the applied snapshot again, so the source is retried on the next update.
+                with self.sources_lock:
+                    self.dirty_sources.add(name)
+                continue
 
-        for group in groups:
-            for item in self.obs_client.get_group_scene_item_list(group).scene_items:
-                sources[item["sourceName"]] = item["inputKind"]
+            with self.sources_lock:
+                self.shadow_settings[name] = self.shadow_settings.get(name, {}) | writes[name]
 
-        return sources
+            events.record("updated", self.name, name, writes[name])
+            if debug:
+                self.logger.debug("Updated source '%s' with %s.", name, writes[name])
 
-    def get_sources_types_with_cells(self):
-        sources = self.get_source_types()
+    def is_priority(self, cell):
+        sheet, row, col = cell
+        for priority_sheet, (top, left, bottom, right) in self.priority_ranges:
+            if (
+                sheet == priority_sheet
+                and top <= row
+                and (bottom is None or row <= bottom)
+                and left <= col
+                and (right is None or col <= right)
+            ):
+                return True
+
+        return False
+
+    def get_bindings(self):
+        # (sheet, row, col) -> [(name, handler)], only rebuilt when the set of sources has changed.
+        with self.sources_lock:
+            if self.bindings_version == self.sources_version:
+                return self.bindings
+
+            version = self.sources_version
+            sources = dict(self.sources)
+
+        bindings = {}
+        source_cells = {}
+        source_templates = {}
+        cell_templates = {}
         for name, input_kind in sources.items():
-            match self.source_name_to_indices(name):
-                case (row, col):
-                    yield (name, input_kind, row, col)
-                case _:
+            template = self.source_template(name)
+            if template is not None:
+                cells = [self.resolve_cell(*cell) for cell in template.cells]
+            else:
+                cell = self.source_name_to_cell(name)
+                if cell is None:
+                    continue
+
+                cells = [cell]
+
+            unknown = [sheet[0] for sheet, _, _ in cells if sheet[0] not in self.spreadsheet_aliases]
+            if unknown:
+                alias = unknown[0]
+                self.logger.warning(f"Unknown spreadsheet '{alias}' for source '{name}'. Add it to `spreadsheets`.")
+                continue
+
+            handler = resolve_handler(input_kind)
+            if handler is None:
+                self.logger.warning(
+                    f"Unsupported source type '{input_kind}' for source '{name}'. Consider opening an issue to request support for this type."
+                )
+                continue
+
+            if template is None:
+                bindings.setdefault(cell, []).append((name, handler))
+                source_cells[name] = cell
+                continue
+
+            source_templates[name] = (template, cells, handler)
+            for cell in cells:
+                bindings.setdefault(cell, [])
+                cell_templates.setdefault(cell, []).append(name)
+
+        self.bindings = bindings
+        self.source_cells = source_cells
+        self.source_templates = source_templates
+        self.cell_templates = cell_templates
+        self.priority_sources = {name for name, cell in source_cells.items() if self.is_priority(cell)}
+        self.priority_sources.update(
+            name for name, (_, cells, _) in source_templates.items() if any(map(self.is_priority, cells))
+        )
+        self.bindings_version = version
+        return bindings
+
+    def cell_value(self, data, cell, dimension):
+        sheet, row, col = cell
+        values = data.get(sheet)
+        return self.value_of_indices(values, row, col, dimension) if values is not None else None
+
+    def stage_write(self, writes, name, handler, new_value, now):
+        setting = handler[0]
+        if self.media_cache and setting in CACHEABLE_SETTINGS and is_remote(new_value):
+            # Until the download lands OBS gets the URL itself, as it would without the cache.
+            new_value = self.media_cache.local_path(new_value) or new_value
+
+        if self.get_shadow_settings(name).get(setting, None) == new_value:
+            self.write_gate.cancel(name)
+            return
+
+        if self.write_gate.offer(name, handler, {setting: new_value}, now):
+            writes[name] = {setting: new_value}
+
+    def update_sources(self, data, dimension, changed_cells=None):
+        # `data` is {sheet: values} and `changed_cells` is the set of (sheet, row, col) that differ from the previous snapshot, or None to
+        # re-evaluate every bound source.
+        self.refresh_sources()
+        with self.sources_lock:
+            dirty, self.dirty_sources = self.dirty_sources, set()
+
+        try:
+            self.write_sources(data, dimension, changed_cells, dirty)
+        except Exception:
+            # The snapshot is not recorded as applied, so changed cells are diffed again on the next update, but
+            # sources that were only dirty would be lost.
+            with self.sources_lock:
+                self.dirty_sources |= dirty
+            raise
+
+    def write_sources(self, data, dimension, changed_cells, dirty):
+        if changed_cells is not None and not changed_cells and not dirty and not self.write_gate.pending:
+            return
+
+        bindings = self.get_bindings()
+        if changed_cells is None:
+            cells = bindings.keys()
+        else:
+            if len(changed_cells) < len(bindings):
+                cells = {cell for cell in changed_cells if cell in bindings}
+            else:
+                cells = {cell for cell in bindings if cell in changed_cells}
+            cells.update(self.source_cells[name] for name in dirty if name in self.source_cells)
+
+        # Each template is rendered once per update, however many of its cells changed.
+        templates = {name for name in dirty if name in self.source_templates}
+        writes = {}
+        now = time.monotonic()
+        # Checked once per update rather than per source, and messages are only formatted when they are emitted.
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        for cell in cells:
+            if cell in self.cell_templates:
+                templates.update(self.cell_templates[cell])
+                if not bindings[cell]:
                     continue
 
-    def update_sources(self, data, dimension):
-        sources = self.get_sources_types_with_cells()
-        for name, input_kind, row, col in sources:
-            old_settings = self.obs_client.get_input_settings(name).input_settings
-            match self.value_of_indices(data, row, col, dimension):
+            sheet, row, col = cell
+            match self.cell_value(data, cell, dimension):
                 case None:
                     # Not continuing here to allow clearing sources if needed
-                    self.logger.debug(f"No data found for source '{name}' at ({row}, {col}).")
-                case value if value in ["#N/A", "#VALUE!", "#REF!", "#DIV/0!", "#NUM!", "#NAME?", "#NULL!", "#ERROR!"]:
-                    self.logger.debug(f"Warning: Error value for source '{name}' at ({row}, {col}): '{value}'")
-                    continue
+                    if debug:
+                        self.logger.debug("No data found for sources at %s (%d, %d).", sheet, row, col)
+                case value if value in ERROR_VALUES:
+                    if debug:
+                        self.logger.debug(
+                            "Warning: Error value for sources at %s (%d, %d): '%s'", sheet, row, col, value
+                        )
                 case value:
-                    match input_kind:
-                        case "image_source" | "xObsAsyncImageSource":
-                            old_value = old_settings.get("file", None)
-                            if old_value == value:
-                                continue
-
-                            self.obs_client.set_input_settings(name, {"file": value}, True)
-                            self.logger.debug(f"Updated image source '{name}' to '{value}'.")
-                        case input_kind if input_kind.startswith("text_"):
-                            old_value = old_settings.get("text", None)
-                            if old_value == value:
-                                continue
-
-                            self.obs_client.set_input_settings(name, {"text": value}, True)
-                            self.logger.debug(f"Updated text source '{name}' to '{value}'.")
-                        case input_kind if input_kind.startswith("color_source"):
-                            color = self.map_cell_color(value)
-                            old_value = old_settings.get("color", None)
-                            if old_value == color:
-                                continue
-                            elif color is not None:
-                                self.obs_client.set_input_settings(name, {"color": color}, True)
-                                self.logger.debug(f"Updated color source '{name}' to '{value}'.")
-                            else:
-                                self.logger.warning(
-                                    f"Invalid color format '{value}' for source '{name}'. Expected hex format like '#RRGGBB' or '#AARRGGBB'."
-                                )
-                        case input_kind if input_kind.startswith("browser_source"):
-                            old_value = old_settings.get("url", None)
-                            if old_value == value:
-                                continue
-
-                            self.obs_client.set_input_settings(name, {"url": value}, True)
-                            self.logger.debug(f"Updated browser source '{name}' to '{value}'.")
-                        case input_kind if input_kind.startswith("media_source"):
-                            old_value = old_settings.get("input", None)
-                            if old_value == value:
-                                continue
-
-                            if re.match(r"^https?://", value):
-                                self.obs_client.set_input_settings(name, {"input": value}, True)
-                                self.logger.debug(f"Updated media source '{name}' to '{value}'.")
-                            elif re.match(r"^[a-zA-Z]:\\", value) or value.startswith("/"):
-                                self.obs_client.set_input_settings(name, {"input": value}, True)
-                                self.logger.debug(f"Updated media source '{name}' to '{value}'.")
-                            else:
-                                self.logger.warning(
-                                    f"Invalid media source URL or path '{value}' for source '{name}'. Must be a valid URL or absolute file path."
-                                )
-                        case _:
-                            self.logger.warning(
-                                f"Unsupported source type '{input_kind}' for source '{name}'. Consider opening an issue to request support for this type."
-                            )
+                    # Sources sharing a cell and a handler share one conversion.
+                    converted = {}
+                    for name, handler in bindings[cell]:
+                        _, convert, invalid = handler
+                        if handler not in converted:
+                            converted[handler] = convert(value) if convert else value
+
+                        new_value = converted[handler]
+                        if new_value is None:
+                            self.logger.warning(invalid.format(value=value, name=name))
+                            events.record("invalid", self.name, name, value)
+                            continue
+
+                        self.stage_write(writes, name, handler, new_value, now)
+
+        for name in templates:
+            template, template_cells, handler = self.source_templates[name]
+            values = [self.cell_value(data, cell, dimension) for cell in template_cells]
+            if any(value in ERROR_VALUES for value in values):
+                if debug:
+                    self.logger.debug("Warning: Error value in template '%s' for source '%s'.", template.text, name)
+                continue
+
+            # Empty cells render as nothing, so a template still shows while some of its cells are blank.
+            text = template.render(values)
+            _, convert, invalid = handler
+            new_value = convert(text) if convert else text
+            if new_value is None:
+                self.logger.warning(invalid.format(value=text, name=name))
+                events.record("invalid", self.name, name, text)
+                continue
+
+            self.stage_write(writes, name, handler, new_value, now)
+
+        self.set_input_settings_batch(self.write_gate.release(writes, now, self.priority_sources))
@@ -2,9 +2,10 @@ import sys
 import tomllib
 
 from PySide6.QtCore import QThread, Slot
-from PySide6.QtWidgets import QApplication, QFileDialog, QMainWindow
+from PySide6.QtWidgets import QApplication, QFileDialog, QMainWindow, QMessageBox
 
 from config import Config
+from events import events
 from generated import widget_ui as widget
 from worker import Worker
 
@@ -43,6 +44,7 @@ class Window(QMainWindow):
             self.ui.auth_enabled.setChecked(bool(password))
             self.ui.password.setText(password)
             self.config.update_from_ui(self.ui)
+            self.config.update_from_toml(config)
 
     @Slot()
     def on_start_clicked(self):
@@ -85,6 +87,21 @@ class Window(QMainWindow):
         self.ui.auth_enabled.setEnabled(True)
         self.ui.password.setReadOnly(not self.ui.auth_enabled.isChecked())
 
+    @Slot()
+    def on_events_clicked(self):
+        lines = events.lines()
+        box = QMessageBox(self)
+        box.setWindowTitle("Recent Events")
+        box.setText(f"{len(lines)} recent event(s), oldest first.")
+        box.setDetailedText("\n".join(lines))
+        save = box.addButton("Save...", QMessageBox.ButtonRole.ActionRole)
+        box.addButton(QMessageBox.StandardButton.Close)
+        box.exec()
+        if box.clickedButton() is save:
+            path, _ = QFileDialog.getSaveFileName(self, "Save Recent Events", "events.log", "Log Files (*.log)")
+            if path:
+                events.dump(path, reason="saved from the window")
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
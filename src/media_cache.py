@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import metrics
+
+DOWNLOAD_TIMEOUT = 10
+DOWNLOAD_WORKERS = 4
+CHUNK_SIZE = 64 * 1024
+INDEX_FILE = "index.json"
+# Failed downloads are retried after this long, doubling on each failure up to RETRY_MAX_SECONDS.
+RETRY_MIN_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+IMAGE_EXTENSIONS = frozenset([".apng", ".avif", ".bmp", ".gif", ".jpeg", ".jpg", ".png", ".svg", ".tga", ".webp"])
+VIDEO_EXTENSIONS = frozenset([".avi", ".flv", ".m4v", ".mkv", ".mov", ".mp4", ".ts", ".webm"])
+AUDIO_EXTENSIONS = frozenset([".aac", ".flac", ".m4a", ".mp3", ".ogg", ".opus", ".wav"])
+MEDIA_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS | AUDIO_EXTENSIONS
+MEDIA_CONTENT_TYPES = ("image/", "video/", "audio/")
+
+
+def is_remote(value):
+    return isinstance(value, str) and value.startswith(("https://", "http://"))
+
+
+def url_suffix(url):
+    return Path(urlparse(url).path).suffix.lower()
+
+
+# URLs without an extension, as served by many CDNs, are only kept if their Content-Type turns out to be media.
+def is_media_url(value):
+    return is_remote(value) and url_suffix(value) in MEDIA_EXTENSIONS | {""}
+
+
+class MediaCache:
+    # Downloads image and media URLs found in the fetched sheet ahead of time, so OBS can be pointed at a local
+    # file and a swap never waits on the network. Files are named by the SHA-256 of their content, so the same
+    # file behind several URLs is stored once, and the least recently used ones are evicted past `max_bytes`.
+    def __init__(self, config, in_use=None):
+        self.logger = logging.getLogger(__name__)
+        self.directory = Path(config.media_cache_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(config.media_cache_size_mb) * 1024 * 1024
+        self.session = requests.Session()
+        self.executor = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="media-cache")
+        self.lock = threading.Lock()
+        # URL -> file name, persisted so downloads survive restarts.
+        self.files = {}
+        # File name -> size in bytes, in least to most recently used order.
+        self.sizes = {}
+        self.in_flight = set()
+        # URL -> (when to retry, failures so far) for downloads that failed, e.g. on a timeout.
+        self.failed = {}
+        # URLs that are not media, such as web pages, which are never downloaded.
+        self.skipped = set()
+        # Returns the paths of cached files OBS is currently pointed at, which are never evicted.
+        self.in_use = in_use or set
+        # Values objects already scanned, by sheet, so unchanged sheets are skipped.
+        self.scanned = {}
+        self.load_index()
+
+    def load_index(self):
+        try:
+            index = json.loads((self.directory / INDEX_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            index = {}
+
+        entries = []
+        for path in self.directory.iterdir():
+            if path.suffix == ".part":
+                # Left over from a download that was interrupted.
+                path.unlink(missing_ok=True)
+            elif path.name != INDEX_FILE and path.is_file():
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self.sizes[name] = size
+        self.files = {url: name for url, name in index.items() if name in self.sizes}
+
+    def save_index(self):
+        # Written to a temporary file first so a crash never leaves a truncated index.
+        with self.lock:
+            index = dict(self.files)
+        path = self.directory / INDEX_FILE
+        with tempfile.NamedTemporaryFile("w", dir=self.directory, delete=False, encoding="utf-8") as file:
+            json.dump(index, file)
+        os.replace(file.name, path)
+
+    def local_path(self, url):
+        # Returns the cached file for a URL, or None if it has not been downloaded (yet).
+        with self.lock:
+            name = self.files.get(url)
+            if name is None:
+                return None
+
+            self.sizes[name] = self.sizes.pop(name)
+        metrics.count("media_cache_hits")
+        return str(self.directory / name)
+
+    def prefetch(self, data):
+        # Called with every fetched snapshot. Only sheets whose values changed are scanned, on a download thread.
+        changed = {sheet: values for sheet, values in data.items() if self.scanned.get(sheet) is not values}
+        if changed:
+            self.scanned = dict(data)
+            self.executor.submit(self.scan, changed)
+
+        # Failed downloads are retried here, since an unchanged sheet is not scanned again.
+        now = time.monotonic()
+        with self.lock:
+            due = [url for url, (when, _) in self.failed.items() if when <= now and url not in self.in_flight]
+            self.in_flight.update(due)
+        for url in due:
+            self.executor.submit(self.download, url)
+
+    def scan(self, sheets):
+        urls = {value for values in sheets.values() for line in values for value in line if is_media_url(value)}
+        with self.lock:
+            urls -= self.files.keys() | self.in_flight | self.failed.keys() | self.skipped
+            self.in_flight |= urls
+
+        for url in urls:
+            self.executor.submit(self.download, url)
+
+    def download(self, url):
+        suffix = Path(urlparse(url).path).suffix[:16] or ".bin"
+        digest = hashlib.sha256()
+        temporary = None
+        try:
+            with metrics.timed("media_download"), self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                r.raise_for_status()
+                content_type = r.headers.get("Content-Type", "")
+                if not url_suffix(url) and not content_type.startswith(MEDIA_CONTENT_TYPES):
+                    # Such as a web page linked from a text cell. The body is never read.
+                    self.logger.debug(f"Not caching '{url}', which is {content_type or 'of unknown type'}.")
+                    with self.lock:
+                        self.in_flight.discard(url)
+                        self.skipped.add(url)
+                    return
+
+                if not url_suffix(url):
+                    suffix = mimetypes.guess_extension(content_type.partition(";")[0].strip()) or suffix
+                with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".part", delete=False) as file:
+                    temporary = Path(file.name)
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        digest.update(chunk)
+                        file.write(chunk)
+
+            name = digest.hexdigest() + suffix
+            size = temporary.stat().st_size
+            os.replace(temporary, self.directory / name)
+        except (OSError, requests.RequestException) as e:
+            self.logger.warning(f"Failed to cache '{url}': {e}")
+            metrics.count("errors", source="media_cache", code=type(e).__name__)
+            if temporary is not None:
+                temporary.unlink(missing_ok=True)
+            with self.lock:
+                self.in_flight.discard(url)
+                _, failures = self.failed.get(url, (None, 0))
+                delay = min(RETRY_MAX_SECONDS, RETRY_MIN_SECONDS * 2**failures)
+                self.failed[url] = (time.monotonic() + delay, failures + 1)
+            return
+
+        with self.lock:
+            self.in_flight.discard(url)
+            self.failed.pop(url, None)
+            self.files[url] = name
+            self.sizes.pop(name, None)
+            self.sizes[name] = size
+        metrics.count("media_cache_bytes", size)
+        self.logger.debug(f"Cached '{url}' as {name}.")
+        self.evict()
+        self.save_index()
+
+    def evict(self):
+        in_use = self.in_use()
+        with self.lock:
+            total = sum(self.sizes.values())
+            evicted = []
+            # The newest file is always kept, even if it alone is over the limit.
+            for name in list(self.sizes)[:-1]:
+                if total <= self.max_bytes:
+                    break
+                if str(self.directory / name) in in_use:
+                    continue
+
+                total -= self.sizes.pop(name)
+                evicted.append(name)
+            if evicted:
+                self.files = {url: name for url, name in self.files.items() if name in self.sizes}
+
+        for name in evicted:
+            (self.directory / name).unlink(missing_ok=True)
+            self.logger.debug(f"Evicted {name} from the media cache.")
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "obs_gsheets"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Metrics:
+    # Process-wide counters and phase timings, exported in the Prometheus text format and, per tick, as JSONL.
+    # Each thread can have one trace open at a time; timings and counts recorded on that thread while it is
+    # open are also added to it, and the trace is written out as one line when it ends.
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.counters = {}
+        # (name, labels) -> [bucket counts..., count, sum]
+        self.timings = {}
+        self.local = threading.local()
+        self.trace_file = None
+        self.server = None
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+        trace = getattr(self.local, "trace", None)
+        if trace is not None:
+            counts = trace["counts"]
+            trace_key = name if not labels else f"{name}{format_labels(sorted(labels.items()))}"
+            counts[trace_key] = counts.get(trace_key, 0) + value
+
+    def observe(self, phase, seconds, **labels):
+        key = (phase, tuple(sorted(labels.items())))
+        with self.lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                timing = self.timings[key] = [0] * (len(BUCKETS) + 2)
+
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    timing[index] += 1
+            timing[-2] += 1
+            timing[-1] += seconds
+
+        trace = getattr(self.local, "trace", None)
+        if trace is not None:
+            phases = trace["phases"]
+            phases[phase] = phases.get(phase, 0) + seconds
+
+    @contextmanager
+    def timed(self, phase, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start, **labels)
+
+    def begin_trace(self, kind, **fields):
+        self.local.trace = {"kind": kind, **fields, "start": time.time(), "phases": {}, "counts": {}}
+        self.local.trace_started = time.perf_counter()
+
+    def end_trace(self):
+        trace = getattr(self.local, "trace", None)
+        if trace is None:
+            return
+
+        self.local.trace = None
+        trace["duration"] = time.perf_counter() - self.local.trace_started
+        self.observe(f"{trace['kind']}_total", trace["duration"])
+        if self.trace_file is not None:
+            line = json.dumps(trace, separators=(",", ":")) + "\n"
+            with self.lock:
+                if self.trace_file is not None:
+                    self.trace_file.write(line)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timings = sorted((key, list(timing)) for key, timing in self.timings.items())
+
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            for (counter, labels), value in counters:
+                if counter == name:
+                    lines.append(f"{PREFIX}_{name}_total{format_labels(labels)} {value}")
+
+        if timings:
+            lines.append(f"# TYPE {PREFIX}_phase_seconds histogram")
+        for (phase, labels), timing in timings:
+            labels = (("phase", phase), *labels)
+            for bound, bucket in zip(BUCKETS, timing):
+                lines.append(f"{PREFIX}_phase_seconds_bucket{format_labels((*labels, ('le', bound)))} {bucket}")
+            lines.append(f"{PREFIX}_phase_seconds_bucket{format_labels((*labels, ('le', '+Inf')))} {timing[-2]}")
+            lines.append(f"{PREFIX}_phase_seconds_count{format_labels(labels)} {timing[-2]}")
+            lines.append(f"{PREFIX}_phase_seconds_sum{format_labels(labels)} {timing[-1]}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.metrics = self
+        # A short poll interval keeps `close`, which waits for the serving loop to notice, quick.
+        threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True, name="metrics"
+        ).start()
+        self.logger.info(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+
+    def open_trace(self, path):
+        # Stays open for the life of the process and is closed in `close`.
+        self.trace_file = open(path, "a", encoding="utf-8", buffering=1)  # noqa: SIM115
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        if self.trace_file is not None:
+            with self.lock:
+                self.trace_file.close()
+                self.trace_file = None
+
+
+metrics = Metrics()
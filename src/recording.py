@@ -0,0 +1,92 @@
+import gzip
+import json
+import logging
+import time
+
+from snapshot import changed_cells
+
+
+class Recorder:
+    # Appends each fetched snapshot to a gzip-compressed JSON lines file, as the cells that changed since the
+    # previous one. The first line is a header and the first snapshot is recorded in full.
+    def __init__(self, path, dimension):
+        self.logger = logging.getLogger(__name__)
+        self.dimension = dimension
+        self.file = gzip.open(path, "at", encoding="utf-8")  # noqa: SIM115
+        self.started = time.monotonic()
+        self.previous = {}
+        self.write({"version": 1, "dimension": dimension, "recorded_at": time.time()})
+        self.logger.info(f"Recording snapshots to {path}.")
+
+    def write(self, line):
+        self.file.write(json.dumps(line, separators=(",", ":")) + "\n")
+        # A sync flush keeps everything written so far readable even if the process is killed.
+        self.file.flush()
+
+    def record(self, data):
+        cells = changed_cells(self.previous, data, self.dimension)
+        self.previous = data
+        if not cells:
+            return
+
+        delta = []
+        for sheet, row, col in sorted(cells, key=lambda cell: (str(cell[0]), cell[1], cell[2])):
+            major, minor = (row, col) if self.dimension == "ROWS" else (col, row)
+            values = data[sheet]
+            line = values[major] if major < len(values) else []
+            delta.append([*sheet, row, col, line[minor] if minor < len(line) else None])
+
+        self.write({"t": round(time.monotonic() - self.started, 3), "cells": delta})
+
+    def close(self):
+        self.file.close()
+
+
+# Yields (seconds since the recording started, dimension, {sheet: values}) for every snapshot in a recording, rebuilt
+# from the deltas. Sheets and rows a snapshot changed get new lists, so they diff like freshly fetched ones.
+# A file appended to by several runs replays them back to back.
+def read_recording(path):
+    data = {}
+    dimension = "ROWS"
+    offset = 0
+    last = 0
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                if not line.endswith("\n"):
+                    # Cut off mid-write.
+                    break
+
+                snapshot = json.loads(line)
+                if "cells" not in snapshot:
+                    data = {}
+                    dimension = snapshot["dimension"]
+                    offset = last
+                    continue
+
+                data = dict(data)
+                copied = set()
+                for alias, tab_name, row, col, value in snapshot["cells"]:
+                    sheet = (alias, tab_name)
+                    major, minor = (row, col) if dimension == "ROWS" else (col, row)
+                    if sheet not in copied:
+                        data[sheet] = list(data.get(sheet, []))
+                        copied.add(sheet)
+
+                    values = data[sheet]
+                    while len(values) <= major:
+                        values.append([])
+                    if (sheet, major) not in copied:
+                        values[major] = list(values[major])
+                        copied.add((sheet, major))
+
+                    target = values[major]
+                    if len(target) <= minor:
+                        target.extend([None] * (minor + 1 - len(target)))
+                    target[minor] = value
+
+                last = offset + snapshot["t"]
+                yield last, dimension, data
+        except EOFError:
+            # The recording was not closed cleanly; everything up to the last flush is still valid.
+            pass
@@ -0,0 +1,91 @@
+import logging
+import random
+import time
+
+# After a change, polling stays at the floor for this long before backing off towards the idle interval.
+HOT_SECONDS = 30
+IDLE_GROWTH = 1.5
+MAX_BACKOFF_SECONDS = 60
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, cost, when):
+        # Takes `cost` tokens and returns the earliest time at or after `when` that they are available.
+        when = max(when, self.updated)
+        self.tokens = min(self.capacity, self.tokens + (when - self.updated) * self.rate)
+        self.updated = when
+        self.tokens -= cost
+        if self.tokens >= 0:
+            return when
+
+        return when + -self.tokens / self.rate
+
+    def take(self, cost, when):
+        # Takes `cost` tokens at `when` only if that delays no reservation already made, e.g. the next poll.
+        # Returns whether they were taken, for requests that are skipped rather than waited for.
+        tokens = min(self.capacity, self.tokens + max(0, when - self.updated) * self.rate)
+        if tokens < cost:
+            return False
+
+        self.tokens = tokens - cost
+        self.updated = max(when, self.updated)
+        return True
+
+
+class Scheduler:
+    def __init__(self, config):
+        self.logger = logging.getLogger(__name__)
+        self.floor = config.min_update_interval / 1000
+        self.ceiling = config.idle_update_interval / 1000
+        self.interval = config.update_interval / 1000
+        self.last_change = None
+        self.failures = 0
+        # Until then, requests made in between polls are skipped, as the Sheets API asked to back off.
+        self.resume_at = 0.0
+        self.bucket = TokenBucket(config.quota_per_minute)
+
+    def backoff(self):
+        self.failures += 1
+        delay = min(MAX_BACKOFF_SECONDS, self.interval * 2**self.failures)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def backs_off(self, statuses, now):
+        # Returns whether `statuses` asked to back off, in which case `resume_at` is moved past the backoff.
+        if not any(status == 429 or status >= 500 for status in statuses):
+            return False
+
+        delay = self.backoff()
+        self.logger.warning(f"Sheets API returned {statuses}, backing off for {delay:.1f}s.")
+        self.resume_at = now + delay
+        return True
+
+    def targeted_fetched(self, statuses):
+        # Called after a fetch made in between polls. Its errors back off polling as well.
+        self.backs_off(statuses, time.monotonic())
+
+    def next_tick(self, last_tick, changed, statuses, cost):
+        # Returns when the next fetch should start, given the result of the fetch started at `last_tick`.
+        now = time.monotonic()
+        if self.backs_off(statuses, now):
+            return self.bucket.reserve(cost, self.resume_at)
+
+        self.failures = 0
+        if changed:
+            self.last_change = now
+            self.interval = self.floor
+        elif self.last_change is None or now - self.last_change > HOT_SECONDS:
+            self.interval = max(self.floor, min(self.ceiling, self.interval * IDLE_GROWTH))
+
+        when = last_tick + self.interval
+        if when < now:
+            # A slow fetch or apply ran past this tick, so poll now rather than trying to catch up.
+            self.logger.debug("Tick overran by %.3fs.", now - when)
+            when = now
+
+        return self.bucket.reserve(cost, when)
@@ -0,0 +1,579 @@
+import codecs
+import functools
+import hashlib
+import json
+import logging
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+REQUEST_TIMEOUT = 5
+# Recorded in `errors` when a request fails without a response. Scheduled like a 5xx status.
+NETWORK_ERROR = 599
+STREAM_CHUNK_SIZE = 64 * 1024
+# Shared by every row without bound cells when streaming, so skipped rows cost one list slot each.
+EMPTY_ROW = ()
+# Fetching a range has a fixed cost (request overhead, JSON framing) roughly equal to this many cells,
+# so two ranges are merged whenever their bounding box costs less than fetching them separately.
+RANGE_OVERHEAD_CELLS = 64
+# Each range adds about 30 bytes to the request URL, so a sheet is fetched in at most this many.
+MAX_PLANNED_RANGES = 200
+# A single cell such as `B12`, `$AB$12`, `Tab!C4` or `'Tab Name'!C4`. Columns go up to ZZZ like Sheets itself.
+CELL_PATTERN = re.compile(r"^(?:'((?:[^']|'')+)'!|([^'!]+)!)?\$?([A-Za-z]{1,3})\$?([1-9][0-9]*)$")
+
+
+def column_letters(col):
+    letters = ""
+    col += 1
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+
+    return letters
+
+
+def column_index(letters):
+    col = 0
+    for letter in letters.upper():
+        col = col * 26 + ord(letter) - ord("A") + 1
+
+    return col - 1
+
+
+def quote_tab(tab_name):
+    quoted = tab_name.replace("'", "''")
+    return f"'{quoted}'"
+
+
+def range_to_a1(tab_name, top, left, bottom, right):
+    return f"{quote_tab(tab_name)}!{column_letters(left)}{top + 1}:{column_letters(right)}{bottom + 1}"
+
+
+# Returns the zero-based (row, col) of the top-left cell of an A1 range such as `'Tab'!B2:D9` or `A:Z`.
+def range_origin(a1_range):
+    matched = re.match(r"^\$?([A-Za-z]*)\$?([0-9]*)", a1_range.rsplit("!", 1)[-1])
+    col = column_index(matched.group(1)) if matched.group(1) else 0
+    row = int(matched.group(2)) - 1 if matched.group(2) else 0
+    return (row, col)
+
+
+# Returns (tab name or None, row, col) with zero-based indices for a single A1 cell, or None if it is not one.
+# Source names are parsed again whenever the bindings are rebuilt, so results are memoized.
+@functools.lru_cache(maxsize=4096)
+def parse_cell(a1_cell):
+    matched = CELL_PATTERN.match(a1_cell.strip())
+    if not matched:
+        return None
+
+    if matched.group(1):
+        tab_name = matched.group(1).replace("''", "'")
+    elif matched.group(2):
+        tab_name = matched.group(2).strip()
+    else:
+        tab_name = None
+    return (tab_name, int(matched.group(4)) - 1, column_index(matched.group(3)))
+
+
+# Returns the zero-based (top, left, bottom, right) of an A1 range such as `B2:D9`, `C4`, `A:B` or `2:5`,
+# where bottom or right is None if the range is open on that side.
+def range_bounds(a1_range):
+    cells = a1_range.rsplit("!", 1)[-1]
+    start, _, end = cells.partition(":")
+    top, left = range_origin(start)
+    if not end:
+        return (top, left, top, left)
+
+    matched = re.match(r"^\$?([A-Za-z]*)\$?([0-9]*)$", end)
+    right = column_index(matched.group(1)) if matched and matched.group(1) else None
+    bottom = int(matched.group(2)) - 1 if matched and matched.group(2) else None
+    return (top, left, bottom, right)
+
+
+# Returns ((alias, tab), A1 range) for a reference such as `B2:D4`, `'Tab Name'!B2:D4` or `alias:Tab!B2:D4`.
+def parse_range_reference(reference, default_tab):
+    # An alias is only read when a tab follows it, so a bare range such as `A1:B2` is never split at its colon.
+    matched = re.match(r"^(?:([\w-]+):(?=[^!]*!))?(?:'((?:[^']|'')+)'!|([^'!:]+)!)?([^!]+)$", reference.strip())
+    if not matched:
+        raise ValueError(f"Invalid range '{reference}'")
+
+    if matched.group(2):
+        tab_name = matched.group(2).replace("''", "'")
+    else:
+        tab_name = (matched.group(3) or default_tab).strip()
+    return ((matched.group(1), tab_name), matched.group(4))
+
+
+def range_area(rect):
+    top, left, bottom, right = rect
+    return (bottom - top + 1) * (right - left + 1)
+
+
+# Derives a small set of (top, left, bottom, right) rectangles covering every (row, col) in `cells`.
+def plan_ranges(cells):
+    gap = RANGE_OVERHEAD_CELLS // 8
+    # Column spans per row, joining neighbours separated by only a few empty cells.
+    spans = {}
+    for row, col in sorted(cells):
+        row_spans = spans.setdefault(row, [])
+        if row_spans and col - row_spans[-1][1] <= gap:
+            row_spans[-1][1] = col
+        else:
+            row_spans.append([col, col])
+
+    # Stack identical spans on nearby rows into rectangles.
+    rects = []
+    open_rects = {}
+    for row in sorted(spans):
+        for left, right in spans[row]:
+            rect = open_rects.get((left, right))
+            if rect is not None and row - rect[2] <= gap:
+                rect[2] = row
+            else:
+                rect = [row, left, row, right]
+                open_rects[(left, right)] = rect
+                rects.append(rect)
+
+    # Past MAX_PLANNED_RANGES the query string grows too long, so rectangles are merged more eagerly until it fits.
+    overhead = RANGE_OVERHEAD_CELLS
+    rects = merge_ranges([tuple(rect) for rect in rects], overhead)
+    while len(rects) > MAX_PLANNED_RANGES:
+        overhead *= 4
+        rects = merge_ranges(rects, overhead)
+
+    return sorted(rects)
+
+
+# Merges pairs of rectangles while their bounding box costs at most `overhead` cells more than the two of them.
+# Two rectangles more than `overhead` rows apart never qualify, so a sweep down the sheet only compares each one
+# with those that end close above it.
+def merge_ranges(rects, overhead):
+    done = []
+    active = []
+    for rect in sorted(rects):
+        still_active = []
+        for other in active:
+            (done if rect[0] - other[2] > overhead else still_active).append(other)
+        active = still_active
+        merged = True
+        while merged:
+            merged = False
+            for index, other in enumerate(active):
+                union = (
+                    min(rect[0], other[0]),
+                    min(rect[1], other[1]),
+                    max(rect[2], other[2]),
+                    max(rect[3], other[3]),
+                )
+                if range_area(union) <= range_area(rect) + range_area(other) + overhead:
+                    rect = union
+                    del active[index]
+                    merged = True
+                    break
+        active.append(rect)
+
+    return done + active
+
+
+class ValueStream:
+    # Reads a batchGet response body one JSON value at a time as it downloads, so the whole body is never held
+    # in memory at once. Only as much text as the value being decoded (e.g. one row) is buffered.
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.digest = hashlib.blake2b(digest_size=16)
+        self.size = 0
+        self.buffer = ""
+        self.pos = 0
+
+    def fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            raise ValueError("Response ended unexpectedly")
+
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        self.buffer = self.buffer[self.pos :] + self.decoder.decode(chunk)
+        self.pos = 0
+
+    def peek(self):
+        # Returns the next non-whitespace character without consuming it.
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at '{self.buffer[self.pos : self.pos + 20]}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the buffer, so try again with more of the body.
+                self.fill()
+                continue
+
+            # A number at the very end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and not isinstance(value, (str, list, dict)):
+                self.fill()
+                continue
+
+            self.pos = end
+            return value
+
+    def items(self, close):
+        # Iterates the elements of an array or the keys of an object, leaving the position at each one.
+        self.expect("[" if close == "]" else "{")
+        if self.peek() == close:
+            self.pos += 1
+            return
+
+        while True:
+            yield
+            match self.peek():
+                case ",":
+                    self.pos += 1
+                case char if char == close:
+                    self.pos += 1
+                    return
+                case char:
+                    raise ValueError(f"Unexpected '{char}' in response")
+
+    def finish(self):
+        # Reads whatever is left so the digest covers the whole body.
+        for chunk in self.chunks:
+            self.digest.update(chunk)
+            self.size += len(chunk)
+
+
+class SheetsClient:
+    def __init__(self, config):
+        self.logger = logging.getLogger(__name__)
+        # Spreadsheet alias -> ID, where None is the spreadsheet from `spreadsheet_id`.
+        self.spreadsheets = {None: config.spreadsheet_id} | config.spreadsheets
+        self.base_url = config.sheets_url
+        self.range = config.range
+        self.dimension = config.dimension
+        self.minimal_ranges = config.minimal_ranges
+        self.streaming = config.streaming_parse
+        # Sheet -> {major index: [minor indices]} of the bound cells, which are all that streaming parsing keeps.
+        self.bound = {}
+        self.params = {"key": config.api_key, "majorDimension": config.dimension}
+        # One keep-alive session per worker so consecutive polls reuse the TLS connection.
+        self.session = requests.Session()
+        self.session.mount(config.sheets_url, HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+        # Spreadsheet alias -> [(sheet, A1 range)] requested together in one batchGet, where a sheet is (alias, tab).
+        self.plans = {}
+        # Spreadsheet alias -> (ETag, body digest, {sheet: values}) from its last successful fetch.
+        self.responses = {}
+        self.values = {}
+        self.changed = False
+        # Status codes of the requests that failed during the last fetch.
+        self.errors = []
+        # Sheets dropped from the plan during the last fetch because Sheets rejected their ranges.
+        self.rejected = []
+
+    def plan(self, cells):
+        cells_by_sheet = {}
+        for sheet, row, col in cells:
+            cells_by_sheet.setdefault(sheet, set()).add((row, col))
+
+        plans = {}
+        for sheet, sheet_cells in cells_by_sheet.items():
+            alias, tab_name = sheet
+            if self.minimal_ranges:
+                ranges = [range_to_a1(tab_name, *rect) for rect in plan_ranges(sheet_cells)]
+            else:
+                ranges = [f"{quote_tab(tab_name)}!{self.range}"]
+            plans.setdefault(alias, []).extend((sheet, a1_range) for a1_range in ranges)
+
+        self.plans = plans
+        self.bound = {}
+        for sheet, row, col in cells:
+            major, minor = (row, col) if self.dimension == "ROWS" else (col, row)
+            self.bound.setdefault(sheet, {}).setdefault(major, []).append(minor)
+        # Both describe the old plan, so targeted fetches wait for the next full fetch to lay out the new one.
+        self.responses = {}
+        self.values = {}
+        self.logger.debug(
+            f"Planned {sum(len(ranges) for ranges in plans.values())} range(s) across {len(plans)} spreadsheet(s)."
+        )
+
+    def assemble(self, ranges, value_ranges):
+        # Lay each fetched range out at its sheet position so lookups can use absolute cell indices.
+        # Cells that were not fetched are None, which is treated the same as a missing cell.
+        grids = {}
+        for (sheet, _), value_range in zip(ranges, value_ranges):
+            top, left = range_origin(value_range.get("range", ""))
+            major_offset, minor_offset = (top, left) if self.dimension == "ROWS" else (left, top)
+            values = grids.setdefault(sheet, [])
+            for index, line in enumerate(value_range.get("values", [])):
+                major = major_offset + index
+                while len(values) <= major:
+                    values.append([])
+
+                target = values[major]
+                if len(target) < minor_offset + len(line):
+                    target.extend([None] * (minor_offset + len(line) - len(target)))
+
+                target[minor_offset : minor_offset + len(line)] = line
+
+        return grids
+
+    def stream_grids(self, chunks, ranges):
+        # Like `assemble`, but parses the body while it downloads and keeps only bound cells, so memory grows with
+        # the number of bound cells rather than the size of the ranges. Returns ({sheet: values}, body digest).
+        stream = ValueStream(chunks)
+        grids = {}
+        for _ in stream.items("}"):
+            if stream.value() != "valueRanges":
+                stream.expect(":")
+                stream.value()
+                continue
+
+            stream.expect(":")
+            for index, _ in enumerate(stream.items("]")):
+                sheet, a1_range = ranges[index]
+                bound = self.bound.get(sheet, {})
+                values = grids.setdefault(sheet, [])
+                # The requested range has the same origin as the one in the response, which may come after the values.
+                top, left = range_origin(a1_range)
+                major_offset, minor_offset = (top, left) if self.dimension == "ROWS" else (left, top)
+                for _ in stream.items("}"):
+                    key = stream.value()
+                    stream.expect(":")
+                    if key != "values":
+                        stream.value()
+                        continue
+
+                    for major, _ in enumerate(stream.items("]"), major_offset):
+                        line = stream.value()
+                        minors = bound.get(major)
+                        if not minors:
+                            continue
+
+                        while len(values) <= major:
+                            values.append(EMPTY_ROW)
+                        if values[major] is EMPTY_ROW:
+                            values[major] = [None] * (max(minors) + 1)
+                        target = values[major]
+                        for minor in minors:
+                            if 0 <= minor - minor_offset < len(line):
+                                target[minor] = line[minor - minor_offset]
+
+        stream.finish()
+        metrics.count("sheets_bytes", stream.size)
+        return grids, stream.digest.digest()
+
+    def request_failed(self, error):
+        # A connection error or timeout is treated like a server error, so the scheduler backs off and retries.
+        self.logger.error(f"Failed to reach the Sheets API: {error}")
+        self.errors.append(NETWORK_ERROR)
+        metrics.count("errors", source="sheets", code="network")
+
+    def request(self, alias, a1_ranges, **kwargs):
+        with metrics.timed("sheets_http"):
+            response = self.session.get(
+                f"{self.base_url}/{self.spreadsheets[alias]}/values:batchGet",
+                params=self.params | {"ranges": a1_ranges},
+                timeout=REQUEST_TIMEOUT,
+                **kwargs,
+            )
+        metrics.count("sheets_requests")
+        return response
+
+    def drop_rejected_sheets(self, alias, ranges):
+        # Sheets rejects a whole batchGet with 400 over one bad range, e.g. a misspelled or renamed tab in a source
+        # name. Each sheet is requested on its own to find the bad ones, which are left out of the plan so the
+        # others keep updating. Returns whether any was dropped. If every sheet is rejected, the request itself
+        # is at fault (e.g. an invalid API key) and nothing is dropped.
+        ranges_by_sheet = {}
+        for sheet, a1_range in ranges:
+            ranges_by_sheet.setdefault(sheet, []).append(a1_range)
+        if len(ranges_by_sheet) < 2:
+            return False
+
+        rejected = []
+        for sheet, a1_ranges in ranges_by_sheet.items():
+            try:
+                response = self.request(alias, a1_ranges)
+            except requests.RequestException as e:
+                self.request_failed(e)
+                return False
+            if response.status_code == 400:
+                rejected.append(sheet)
+        if not rejected or len(rejected) == len(ranges_by_sheet):
+            return False
+
+        for sheet in rejected:
+            self.logger.error(f"Sheets rejected the ranges of tab '{sheet[1]}', which is skipped until sources change.")
+            metrics.count("errors", source="sheets", code="rejected")
+        self.plans[alias] = [(sheet, a1_range) for sheet, a1_range in ranges if sheet not in rejected]
+        self.rejected.extend(rejected)
+        return True
+
+    def fetch_spreadsheet(self, alias, ranges):
+        etag, digest, grids = self.responses.get(alias, (None, None, None))
+        headers = {"If-None-Match": etag} if etag else None
+        try:
+            response = self.request(alias, [a1_range for _, a1_range in ranges], headers=headers, stream=self.streaming)
+        except requests.RequestException as e:
+            self.request_failed(e)
+            return False
+        if self.streaming and response.status_code == 200:
+            with response, metrics.timed("sheets_parse"):
+                try:
+                    new_grids, new_digest = self.stream_grids(response.iter_content(STREAM_CHUNK_SIZE), ranges)
+                except (ValueError, IndexError, requests.RequestException) as e:
+                    self.logger.error(f"Failed to parse sheet data: {e}")
+                    self.errors.append(response.status_code)
+                    metrics.count("errors", source="sheets", code="parse")
+                    return False
+
+            # Unchanged values keep their previous objects, as with the buffered path below.
+            if new_digest != digest:
+                grids, digest = new_grids, new_digest
+                self.changed = True
+            self.responses[alias] = (response.headers.get("ETag"), digest, grids)
+            return True
+
+        metrics.count("sheets_bytes", len(response.content))
+        match response.status_code:
+            case 101:
+                self.logger.error("Error 101: Invalid API key or access denied.")
+                self.errors.append(response.status_code)
+                metrics.count("errors", source="sheets", code=response.status_code)
+                return False
+            case 200:
+                etag = response.headers.get("ETag")
+                new_digest = hashlib.blake2b(response.content, digest_size=16).digest()
+                if new_digest != digest:
+                    with metrics.timed("sheets_parse"):
+                        grids = self.assemble(ranges, response.json().get("valueRanges", []))
+                    digest = new_digest
+                    self.changed = True
+            case 304:
+                pass
+            case 400 if self.drop_rejected_sheets(alias, ranges):
+                return self.fetch_spreadsheet(alias, self.plans[alias])
+            case _:
+                self.logger.error(f"Failed to fetch sheet data: {response.status_code}")
+                self.errors.append(response.status_code)
+                metrics.count("errors", source="sheets", code=response.status_code)
+                return False
+
+        self.responses[alias] = (etag, digest, grids)
+        return True
+
+    def fetch(self):
+        # Returns {sheet: values}. Sheets whose spreadsheet did not change keep the same values object,
+        # and a spreadsheet that failed to fetch keeps its last known values.
+        self.changed = False
+        self.errors = []
+        self.rejected = []
+        fetched = [self.fetch_spreadsheet(alias, ranges) for alias, ranges in list(self.plans.items())]
+        if not any(fetched):
+            return None
+
+        values = {}
+        for _, _, grids in self.responses.values():
+            values |= grids
+
+        self.values = values
+        return values
+
+    def patch(self, values, a1_range, lines):
+        # Returns a copy of `values` with the cells of `a1_range` replaced by `lines`. Only the rows it touches are
+        # copied. Cells in the range that came back empty are set to "", as they would be in a full fetch.
+        top, left, bottom, right = range_bounds(a1_range)
+        if self.dimension == "ROWS":
+            major_start, minor_start, major_end, minor_end = top, left, bottom, right
+        else:
+            major_start, minor_start, major_end, minor_end = left, top, right, bottom
+        if major_end is None:
+            major_end = max(len(values), major_start + len(lines)) - 1
+
+        values = list(values)
+        for major in range(major_start, major_end + 1):
+            line = lines[major - major_start] if major - major_start < len(lines) else []
+            if major >= len(values) and not line:
+                continue
+
+            while len(values) <= major:
+                values.append([])
+            target = list(values[major])
+            stop = len(target) if minor_end is None else min(len(target), minor_end + 1)
+            target[minor_start:stop] = [""] * max(0, stop - minor_start)
+            if len(target) < minor_start + len(line):
+                target.extend([None] * (minor_start + len(line) - len(target)))
+            target[minor_start : minor_start + len(line)] = line
+            values[major] = target
+
+        return values
+
+    def fetchable(self, edits):
+        # The (sheet, A1 range) pairs that `fetch_ranges` can patch, i.e. on sheets fully fetched since the last plan.
+        return [(sheet, a1_range) for sheet, a1_range in edits if sheet in self.values and sheet[0] in self.responses]
+
+    def fetch_ranges(self, edits):
+        # Fetches only the given (sheet, A1 range) pairs, such as cells reported as edited, and patches them into
+        # the last snapshot. Returns the new {sheet: values}, or None if nothing was fetched. Sheets that are not
+        # polled are ignored, since no source reads from them.
+        ranges_by_alias = {}
+        for sheet, a1_range in self.fetchable(edits):
+            ranges_by_alias.setdefault(sheet[0], []).append((sheet, a1_range))
+        if not ranges_by_alias:
+            return None
+
+        self.changed = False
+        self.errors = []
+        values = dict(self.values)
+        for alias, ranges in ranges_by_alias.items():
+            try:
+                response = self.request(alias, [f"{quote_tab(sheet[1])}!{a1_range}" for sheet, a1_range in ranges])
+            except requests.RequestException as e:
+                self.request_failed(e)
+                continue
+            metrics.count("sheets_bytes", len(response.content))
+            if response.status_code != 200:
+                self.logger.error(f"Failed to fetch edited ranges: {response.status_code}")
+                self.errors.append(response.status_code)
+                metrics.count("errors", source="sheets", code=response.status_code)
+                continue
+
+            patched = False
+            with metrics.timed("sheets_parse"):
+                for (sheet, a1_range), value_range in zip(ranges, response.json().get("valueRanges", [])):
+                    lines = self.patch(values[sheet], a1_range, value_range.get("values", []))
+                    # Untouched rows are shared, so this only compares the rows in the range.
+                    if lines != values[sheet]:
+                        values[sheet] = lines
+                        patched = True
+            if not patched:
+                continue
+
+            # Dropping the ETag and digest makes the next full fetch replace the patched values even if the sheet
+            # is back to what it was at the last full fetch.
+            _, _, grids = self.responses[alias]
+            self.responses[alias] = (None, None, {sheet: values[sheet] for sheet in grids})
+            self.changed = True
+
+        if not self.changed:
+            return None
+
+        self.values = values
+        return values
+
+    def close(self):
+        self.session.close()
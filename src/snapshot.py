@@ -0,0 +1,28 @@
+# Yields the (row, col) whose value differs between two `values` payloads of the same sheet.
+def changed_grid_cells(previous, current, dimension):
+    previous = previous or []
+    for major in range(max(len(previous), len(current))):
+        old = previous[major] if major < len(previous) else []
+        new = current[major] if major < len(current) else []
+        # Comparing whole rows first keeps the unchanged majority of the sheet at C speed.
+        if old == new:
+            continue
+
+        for minor in range(max(len(old), len(new))):
+            old_value = old[minor] if minor < len(old) else None
+            new_value = new[minor] if minor < len(new) else None
+            if old_value != new_value:
+                yield (major, minor) if dimension == "ROWS" else (minor, major)
+
+
+# Returns the set of (sheet, row, col) whose value differs between two {sheet: values} snapshots.
+def changed_cells(previous, current, dimension):
+    changed = set()
+    for sheet, values in current.items():
+        old = previous.get(sheet)
+        if old is values:
+            continue
+
+        changed.update((sheet, row, col) for row, col in changed_grid_cells(old, values, dimension))
+
+    return changed
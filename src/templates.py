@@ -0,0 +1,54 @@
+import functools
+import re
+
+from sheets import parse_cell
+
+# `{{` and `}}` are literal braces; anything else in braces is a cell such as `{B2}`, `{Tab!B2}` or `{alias:Tab!B2}`.
+PLACEHOLDER_PATTERN = re.compile(r"\{\{|\}\}|\{(?:([\w-]+):)?([^{}]+)\}")
+
+
+def escape(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class Template:
+    # Text combining several cells, e.g. `{B2} {C2} – {D2} {E2}`, compiled into a format string with one positional
+    # field per distinct cell. `cells` holds their (alias or None, tab name or None, row, col) in field order.
+    def __init__(self, text, pattern, cells):
+        self.text = text
+        self.pattern = pattern
+        self.cells = cells
+
+    # Fills in the values of `cells`, in order, where empty cells are None.
+    def render(self, values):
+        return self.pattern.format(*["" if value is None else value for value in values])
+
+
+# Returns the compiled template for a text, or None if it has no cells or a cell is not a valid A1 reference.
+# Templates are compiled whenever the bindings are rebuilt, so results are memoized.
+@functools.lru_cache(maxsize=1024)
+def compile_template(text):
+    parts = []
+    cells = []
+    position = 0
+    for matched in PLACEHOLDER_PATTERN.finditer(text):
+        parts.append(escape(text[position : matched.start()]))
+        position = matched.end()
+        if matched.group(2) is None:
+            parts.append(matched.group(0))
+            continue
+
+        cell = parse_cell(matched.group(2))
+        if cell is None:
+            return None
+
+        cell = (matched.group(1), *cell)
+        if cell not in cells:
+            cells.append(cell)
+        parts.append(f"{{{cells.index(cell)}}}")
+
+    if not cells:
+        return None
+
+    parts.append(escape(text[position:]))
+    return Template(text, "".join(parts), tuple(cells))
@@ -0,0 +1,62 @@
+import time
+
+from handlers import HANDLER_NAMES
+
+
+class WriteGate:
+    # Decides when each OBS write goes out, so a cell that flips several times in a row reaches OBS as its final
+    # value only. Per handler, `debounce` holds a write until its source has not changed for that many seconds,
+    # and `throttle` writes a source at most once per that many seconds, sending the latest value at the end of
+    # the window. `max_per_second` caps writes across all sources, deferring the rest to the next update.
+    def __init__(self, config):
+        self.debounce = {name: float(seconds) for name, seconds in config.obs_debounce.items()}
+        self.throttle = {name: float(seconds) for name, seconds in config.obs_throttle.items()}
+        self.max_per_second = config.obs_max_writes_per_second
+        # At least one write can always build up, so a cap below one per second still lets writes through.
+        self.burst = max(1, self.max_per_second or 0)
+        self.allowance = self.burst
+        self.updated = time.monotonic()
+        # Source name -> (settings, when it may be written).
+        self.pending = {}
+        self.last_written = {}
+
+    def offer(self, name, handler, settings, now):
+        # Returns True if the write can go out now; otherwise it is held and replaces any write held before it.
+        kind = HANDLER_NAMES.get(handler)
+        if kind in self.debounce:
+            self.pending[name] = (settings, now + self.debounce[kind])
+            return False
+
+        if kind in self.throttle:
+            due = self.last_written.get(name, float("-inf")) + self.throttle[kind]
+            if now < due:
+                self.pending[name] = (settings, due)
+                return False
+
+        self.pending.pop(name, None)
+        return True
+
+    def cancel(self, name):
+        # The source already shows the value it would have been set to, e.g. a cell flipped back.
+        self.pending.pop(name, None)
+
+    def release(self, writes, now, priority=()):
+        # Returns the writes to send now, up to the cap: those for `priority` sources first, then held writes that
+        # are due, oldest first, then the rest of `writes`.
+        due = [name for name, (_, when) in self.pending.items() if when <= now and name not in writes]
+        ready = {name: self.pending.pop(name)[0] for name in due} | writes
+        if priority:
+            ready = {name: ready[name] for name in ready if name in priority} | ready
+        if self.max_per_second:
+            self.allowance = min(self.burst, self.allowance + (now - self.updated) * self.max_per_second)
+            self.updated = now
+            allowed = max(0, int(self.allowance))
+            if len(ready) > allowed:
+                names = list(ready)
+                for name in names[allowed:]:
+                    self.pending[name] = (ready.pop(name), now)
+            self.allowance -= len(ready)
+
+        for name in ready:
+            self.last_written[name] = now
+        return ready
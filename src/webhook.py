@@ -0,0 +1,88 @@
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != "/edit":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.send_error(413)
+            return
+
+        try:
+            body = json.loads(self.rfile.read(length))
+            token = str(body.get("token", ""))
+            spreadsheet_id = body.get("spreadsheetId")
+            tab_name = body["tab"]
+            ranges = body["ranges"] if "ranges" in body else [body["range"]]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.send_error(400, "Expected JSON with `tab` and `range` or `ranges`")
+            return
+
+        if self.server.token and not hmac.compare_digest(token, self.server.token):
+            self.send_error(403)
+            return
+
+        if not self.server.webhook.push(spreadsheet_id, tab_name, ranges):
+            self.send_error(404, "Unknown spreadsheet")
+            return
+
+        self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Webhook:
+    # Receives edit notifications, e.g. from an Apps Script "on edit" trigger, as a POST to /edit with a JSON body:
+    # {"spreadsheetId": "...", "tab": "Sheet1", "range": "B2:C4", "token": "..."}, where `spreadsheetId` may be
+    # left out for the main spreadsheet. Edits queue up until the engine takes them with `take`.
+    def __init__(self, config, on_push):
+        self.logger = logging.getLogger(__name__)
+        # Spreadsheet ID -> alias, where None is the spreadsheet from `spreadsheet_id`.
+        self.aliases = {spreadsheet_id: alias for alias, spreadsheet_id in config.spreadsheets.items()}
+        self.aliases[config.spreadsheet_id] = None
+        self.on_push = on_push
+        self.lock = threading.Lock()
+        self.edits = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", config.webhook_port), WebhookHandler)
+        self.server.daemon_threads = True
+        self.server.token = config.webhook_token
+        self.server.webhook = self
+
+    def push(self, spreadsheet_id, tab_name, ranges):
+        if spreadsheet_id is not None and spreadsheet_id not in self.aliases:
+            return False
+
+        sheet = (self.aliases.get(spreadsheet_id), tab_name)
+        with self.lock:
+            self.edits.extend((sheet, str(a1_range).rsplit("!", 1)[-1]) for a1_range in ranges)
+        self.logger.debug(f"Received edit of {ranges} in {sheet}.")
+        self.on_push()
+        return True
+
+    def take(self):
+        with self.lock:
+            edits, self.edits = self.edits, []
+
+        # The same range is often reported several times while a fetch is in flight.
+        return list(dict.fromkeys(edits))
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="webhook").start()
+        self.logger.info(f"Listening for edits on http://127.0.0.1:{self.server.server_address[1]}/edit")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()